@@ -0,0 +1,81 @@
+import argparse
+import re
+import sys
+import threading
+import time
+from typing import List, Tuple
+
+from src.chunked_summary import CHARS_PER_TOKEN, summarize_chunked
+
+
+class StubModel:
+    """generate(text, prompt_id) with fixed latency, recording every call and the most calls in flight."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls: List[Tuple[str, str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def generate(self, text: str, prompt_id: str) -> str:
+        with self._lock:
+            self.calls.append((text, prompt_id))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return f"{prompt_id} of {len(text)} chars"
+
+
+def _snippets(count: int) -> List[str]:
+    return [f"snippet {i} says something about part {i // 10} of the video" for i in range(count)]
+
+
+def _split_on_snippets(chunks: List[str], snippets: List[str]) -> bool:
+    # The chunks, put back in transcript order and cut where a snippet starts, must give the snippets back
+    position = {snippet: i for i, snippet in enumerate(snippets)}
+    pieces = [re.split(r' (?=snippet \d+ says)', chunk) for chunk in chunks]
+    if any(piece not in position for chunk in pieces for piece in chunk):
+        return False
+    pieces.sort(key=lambda chunk: position[chunk[0]])
+    return [piece for chunk in pieces for piece in chunk] == snippets
+
+
+def check(snippets: List[str], token_budget: int, workers: int, latency: float) -> bool:
+    model = StubModel(latency)
+    start = time.perf_counter()
+    summary = summarize_chunked(snippets, model.generate, 'summary', 'chunk', 'reduce',
+                                token_budget=token_budget, workers=workers)
+    elapsed = time.perf_counter() - start
+    chunks = [text for text, prompt_id in model.calls if prompt_id == 'chunk']
+    reduce = [text for text, prompt_id in model.calls if prompt_id == 'reduce']
+    if not chunks:
+        # Short enough for a single prompt
+        ok = [prompt_id for _, prompt_id in model.calls] == ['summary'] and summary.startswith('summary')
+    else:
+        ok = (_split_on_snippets(chunks, snippets)
+              and all(len(chunk) <= token_budget * CHARS_PER_TOKEN for chunk in chunks)
+              and len(reduce) == 1 and reduce[0].count("Part ") == len(chunks) and summary.startswith('reduce')
+              and model.max_in_flight <= workers)
+    print(f"{'ok' if ok else 'FAIL':<5}{len(snippets):>6} snippets{len(chunks):>5} chunks   workers {workers:>2}"
+          f"   max in flight {model.max_in_flight:>2}{elapsed:>8.2f}s")
+    return ok
+
+
+def run(snippets: int, token_budget: int, latency: float, worker_counts) -> bool:
+    ok = check(_snippets(10), token_budget, 1, latency)
+    for workers in worker_counts:
+        ok = check(_snippets(snippets), token_budget, workers, latency) and ok
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map-reduce summary on a stub model: chunk boundaries and parallelism")
+    parser.add_argument("--snippets", type=int, default=2000, help="Snippets in the long transcript")
+    parser.add_argument("--token-budget", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per stub model call")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+    sys.exit(0 if run(args.snippets, args.token_budget, args.latency, args.workers) else 1)
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from src.database import VideoDatabase
+
+
+def _legacy_get_video(db_path, video_id):
+    # The connect-per-call pattern VideoDatabase used before the connection layer.
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute('SELECT * FROM videos WHERE id = ?', (video_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def _legacy_update_video(db_path, video_id):
+    conn = sqlite3.connect(db_path)
+    conn.execute('UPDATE videos SET watched = ? WHERE id = ?', (0, video_id))
+    conn.commit()
+    conn.close()
+
+
+def _seed(db, count):
+    for i in range(count):
+        db.add_video(f"video{i}", f"channel{i % 50}", 600, f"Title {i}", f"2024-01-01T00:{i % 60:02d}:00Z")
+
+
+def _ops_per_sec(fn, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return ops / (time.perf_counter() - start)
+
+
+def run(ops, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        pooled_path = os.path.join(tmp, 'pooled.db')
+
+        legacy_db = VideoDatabase(legacy_path)
+        _seed(legacy_db, rows)
+        legacy_db.close()
+        conn = sqlite3.connect(legacy_path)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+
+        pooled_db = VideoDatabase(pooled_path)
+        _seed(pooled_db, rows)
+
+        results = {
+            'get_video': (
+                _ops_per_sec(lambda i: _legacy_get_video(legacy_path, f"video{i % rows}"), ops),
+                _ops_per_sec(lambda i: pooled_db.get_video(f"video{i % rows}"), ops),
+            ),
+            'update_video': (
+                _ops_per_sec(lambda i: _legacy_update_video(legacy_path, f"video{i % rows}"), ops),
+                _ops_per_sec(lambda i: pooled_db.update_video(f"video{i % rows}", watched=False), ops),
+            ),
+        }
+        pooled_db.close()
+
+    print(f"{'operation':<14}{'before ops/s':>14}{'after ops/s':>14}{'speedup':>10}")
+    for name, (before, after) in results.items():
+        print(f"{name:<14}{before:>14.0f}{after:>14.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VideoDatabase connection benchmark")
+    parser.add_argument("--ops", type=int, default=2000, help="Operations per measurement")
+    parser.add_argument("--rows", type=int, default=500, help="Rows seeded in the videos table")
+    args = parser.parse_args()
+    run(args.ops, args.rows)
@@ -0,0 +1,62 @@
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from src.chunked_summary import CHARS_PER_TOKEN
+from src.transcripts import TranscriptUnavailable
+
+
+class FakeTranscripts:
+    """Stand-in for transcripts.fetch_snippets with fixed latency.
+
+    Which videos fail depends only on the video id: about one in five has captions
+    disabled and one in seven has none yet.
+    """
+
+    def __init__(self, latency: float, snippets: int = 300):
+        self.latency = latency
+        self.snippets = snippets
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, video_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        number = zlib.crc32(video_id.encode())
+        if number % 5 == 0:
+            raise TranscriptUnavailable('disabled', 'Subtitles are disabled for this video')
+        if number % 7 == 0:
+            raise TranscriptUnavailable('not yet', 'The video is a premiere')
+        return [{'text': f"line {i} of {video_id}", 'start': i * 2.5, 'duration': 2.5} for i in range(self.snippets)]
+
+
+class FakeGemini:
+    """Stand-in for gemini_api.summarize_text: latency grows with the prompt and output size.
+
+    A request takes latency plus prompt tokens / prompt_tokens_per_second plus
+    output_tokens / output_tokens_per_second, roughly how a hosted model behaves.
+    """
+
+    def __init__(self, latency: float, output_tokens: int = 200,
+                 prompt_tokens_per_second: float = 50000, output_tokens_per_second: float = 200):
+        self.latency = latency
+        self.output_tokens = output_tokens
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.output_tokens_per_second = output_tokens_per_second
+        self.calls = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def summarize(self, transcript: str, usage: Optional[Dict[str, int]] = None,
+                  snippets: Optional[List[str]] = None) -> Optional[str]:
+        prompt_tokens = len(transcript) // CHARS_PER_TOKEN
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+        time.sleep(self.latency + prompt_tokens / self.prompt_tokens_per_second
+                   + self.output_tokens / self.output_tokens_per_second)
+        if usage is not None:
+            usage.update(prompt_tokens=prompt_tokens, output_tokens=self.output_tokens)
+        return f"Summary of {transcript[:40]}"
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+
+class FakeHttpError(Exception):
+    """Mimics googleapiclient.errors.HttpError closely enough for status checks."""
+
+    class Response:
+        def __init__(self, status: int):
+            self.status = status
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.resp = self.Response(status)
+
+
+class FakeRequest:
+    def __init__(self, youtube: 'FakeYouTube', method: str, handler: Callable[[], Dict[str, Any]]):
+        self.youtube = youtube
+        self.method = method
+        self.handler = handler
+        self.headers: Dict[str, str] = {}
+
+    def execute(self, http=None) -> Dict[str, Any]:
+        self.youtube.count(self.method)
+        time.sleep(self.youtube.latency)
+        response = self.handler()
+        if 'etag' in response and self.headers.get('If-None-Match') == response['etag']:
+            raise FakeHttpError(304)
+        return response
+
+
+class FakeResource:
+    def __init__(self, youtube: 'FakeYouTube', name: str):
+        self.youtube = youtube
+        self.name = name
+
+    def list(self, **kwargs) -> FakeRequest:
+        handler = getattr(self.youtube, f"_{self.name}_list")
+        return FakeRequest(self.youtube, f"{self.name}.list", lambda: handler(**kwargs))
+
+
+class FakeYouTube:
+    """In-process stand-in for the YouTube Data API v3 client returned by googleapiclient.
+
+    Every execute() sleeps for `latency` seconds to model a network round trip,
+    and calls are counted per method so benchmarks can report quota usage.
+    """
+
+    def __init__(self, channels: int = 100, videos_per_channel: int = 20,
+                 latency: float = 0.05, page_size: int = 50):
+        self.latency = latency
+        self.page_size = page_size
+        self.calls: Dict[str, int] = {}
+        self._calls_lock = threading.Lock()
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.channel_ids = [f"UC{i:022d}" for i in range(channels)]
+        self.uploads: Dict[str, List[Dict[str, str]]] = {}
+        for c, channel_id in enumerate(self.channel_ids):
+            self.uploads[self._uploads_id(channel_id)] = [
+                {
+                    'id': f"{channel_id[-6:]}v{v:05d}",
+                    'title': f"Video {v} of channel {c}",
+                    'publishedAt': (start + timedelta(hours=videos_per_channel - v, minutes=c))
+                    .strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    'duration': f"PT{v % 3}H{v % 60}M{(v * 7) % 60}S",
+                }
+                for v in range(videos_per_channel)
+            ]
+        self.video_index = {video['id']: video for uploads in self.uploads.values() for video in uploads}
+
+    def upload(self, channel_index: int) -> None:
+        """Publish a new video at the top of a channel's uploads playlist."""
+        uploads = self.uploads[self._uploads_id(self.channel_ids[channel_index])]
+        newest = uploads[0]
+        video = dict(newest, id=f"{newest['id']}n", title=f"New: {newest['title']}",
+                     publishedAt=(datetime.strptime(newest['publishedAt'], '%Y-%m-%dT%H:%M:%SZ') + timedelta(days=1))
+                     .strftime('%Y-%m-%dT%H:%M:%SZ'))
+        uploads.insert(0, video)
+        self.video_index[video['id']] = video
+
+    def write_feeds(self, directory: str, entries: int = 15) -> str:
+        """Write each channel's uploads Atom feed to directory, returns a file:// url template for them."""
+        for channel_id in self.channel_ids:
+            videos = self.uploads[self._uploads_id(channel_id)][:entries]
+            body = "".join(
+                f"<entry><id>yt:video:{video['id']}</id><yt:videoId>{video['id']}</yt:videoId>"
+                f"<yt:channelId>{channel_id}</yt:channelId><title>{video['title']}</title>"
+                f"<published>{video['publishedAt']}</published></entry>"
+                for video in videos
+            )
+            with open(os.path.join(directory, f"{channel_id}.xml"), 'w') as feed:
+                feed.write('<?xml version="1.0" encoding="UTF-8"?>'
+                           '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" '
+                           'xmlns="http://www.w3.org/2005/Atom">'
+                           f"<title>{channel_id}</title>{body}</feed>")
+        return 'file://' + os.path.join(os.path.abspath(directory), '{channel_id}.xml')
+
+    @staticmethod
+    def _uploads_id(channel_id: str) -> str:
+        return 'UU' + channel_id[2:]
+
+    def count(self, method: str) -> None:
+        with self._calls_lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def subscriptions(self) -> FakeResource:
+        return FakeResource(self, 'subscriptions')
+
+    def channels(self) -> FakeResource:
+        return FakeResource(self, 'channels')
+
+    def playlistItems(self) -> FakeResource:
+        return FakeResource(self, 'playlistItems')
+
+    def videos(self) -> FakeResource:
+        return FakeResource(self, 'videos')
+
+    def _page(self, items: List[Any], page_token: Optional[str], max_results) -> Dict[str, Any]:
+        start = int(page_token or 0)
+        size = min(int(max_results or self.page_size), self.page_size)
+        response: Dict[str, Any] = {'items': items[start:start + size]}
+        response['etag'] = hashlib.sha1(repr(response['items']).encode()).hexdigest()
+        if start + size < len(items):
+            response['nextPageToken'] = str(start + size)
+        return response
+
+    def _subscriptions_list(self, part=None, mine=None, maxResults=None, pageToken=None) -> Dict[str, Any]:
+        items = [
+            {'snippet': {'title': f"Channel {c}", 'resourceId': {'kind': 'youtube#channel', 'channelId': channel_id}}}
+            for c, channel_id in enumerate(self.channel_ids)
+        ]
+        return self._page(items, pageToken, maxResults)
+
+    def _channels_list(self, part=None, id=None, maxResults=None) -> Dict[str, Any]:
+        items = []
+        for channel_id in id.split(','):
+            if channel_id not in self.channel_ids:
+                continue
+            items.append({
+                'id': channel_id,
+                'snippet': {'title': f"Channel {self.channel_ids.index(channel_id)}"},
+                'contentDetails': {'relatedPlaylists': {'uploads': self._uploads_id(channel_id)}},
+            })
+        return {'items': items}
+
+    def _playlistItems_list(self, part=None, playlistId=None, maxResults=None, pageToken=None) -> Dict[str, Any]:
+        items = [
+            {'snippet': {'title': video['title'], 'publishedAt': video['publishedAt'],
+                         'resourceId': {'kind': 'youtube#video', 'videoId': video['id']}}}
+            for video in self.uploads.get(playlistId, [])
+        ]
+        return self._page(items, pageToken, maxResults)
+
+    def _videos_list(self, part=None, id=None, maxResults=None) -> Dict[str, Any]:
+        return {'items': [
+            {'id': video_id, 'contentDetails': {'duration': self.video_index[video_id]['duration']}}
+            for video_id in id.split(',') if video_id in self.video_index
+        ]}
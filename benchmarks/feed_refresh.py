@@ -0,0 +1,60 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fake_youtube import FakeYouTube
+from src import youtube_user
+from src.database import VideoDatabase
+from src.rate_limit import RateLimiter, set_limiter
+
+
+def run(channels: int, videos: int, latency: float, worker_counts) -> None:
+    print(f"{channels} channels, {videos} videos each, {latency * 1000:.0f} ms per request")
+    print(f"{'workers':>8}{'wall s':>10}{'videos':>8}{'requests':>10}")
+    baseline = None
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = VideoDatabase(os.path.join(tmp, 'feed.db'))
+            youtube = FakeYouTube(channels=channels, videos_per_channel=videos, latency=latency)
+            start = time.perf_counter()
+            feed = youtube_user.get_subscription_feed(youtube, db, workers=workers)
+            elapsed = time.perf_counter() - start
+            db.close()
+        if baseline is None:
+            baseline = feed
+        assert feed == baseline, "feed order must not depend on the worker count"
+        print(f"{workers:>8}{elapsed:>10.2f}{len(feed):>8}{sum(youtube.calls.values()):>10}")
+
+
+def run_incremental(channels: int, videos: int, latency: float, workers: int, changed: int, mode: str) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'feed.db'))
+        youtube = FakeYouTube(channels=channels, videos_per_channel=videos, latency=latency)
+        youtube_user.sync_subscription_feed(youtube, db, chunk_size=500, workers=workers)
+        for channel_index in range(changed):
+            youtube.upload(channel_index)
+        feed_url = youtube.write_feeds(tmp)
+        youtube.calls.clear()
+        start = time.perf_counter()
+        stats = youtube_user.sync_subscription_feed(youtube, db, chunk_size=500, workers=workers, mode=mode,
+                                                    feed_url=feed_url)
+        elapsed = time.perf_counter() - start
+        db.close()
+    print(f"incremental {mode} sync with {changed} changed channels: {elapsed:.2f} s, "
+          f"{sum(youtube.calls.values())} requests, {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="get_subscription_feed wall time vs worker count")
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--videos", type=int, default=20, help="Uploads per channel")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake API request")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument("--changed", type=int, default=5, help="Channels with a new upload before the incremental sync")
+    args = parser.parse_args()
+    # The [RateLimit] budget would be what gets measured, not the crawler
+    set_limiter('youtube', RateLimiter('youtube'))
+    run(args.channels, args.videos, args.latency, args.workers)
+    for mode in ('api', 'rss'):
+        run_incremental(args.channels, args.videos, args.latency, max(args.workers), args.changed, mode)
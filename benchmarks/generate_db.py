@@ -0,0 +1,108 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from benchmarks.search import _vocabulary
+from src.database import VideoDatabase
+
+
+BATCH = 10000
+# Videos are spread over this many days before START
+SPAN_DAYS = 5 * 365
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def generate(path: str, videos: int, channels: Optional[int] = None, transcribed: float = 0.2,
+             summarized: float = 0.1, watched: float = 0.3, ditched: float = 0.05,
+             transcript_words: int = 300, seed: int = 0) -> Dict[str, Any]:
+    """Fill a new faria.db at path with a synthetic library, returns what it holds and how long it took.
+
+    Channel sizes and word frequencies follow Zipf's law, the way a real subscription
+    list has a few prolific channels and transcripts repeat a few words a lot.
+    """
+    rng = random.Random(seed)
+    channels = channels or max(10, videos // 200)
+    words = _vocabulary(rng)
+    word_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    channel_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(channels)))
+
+    def text(length: int) -> str:
+        return ' '.join(rng.choices(words, cum_weights=word_weights, k=length))
+
+    start = time.perf_counter()
+    db = VideoDatabase(path)
+    db.add_channels([{'id': f"UC{c:022d}", 'title': f"Channel {c}", 'uploads_playlist_id': f"UU{c:022d}"}
+                     for c in range(channels)])
+    step = SPAN_DAYS * 86400 / videos
+    for first in range(0, videos, BATCH):
+        batch = []
+        for i in range(first, min(videos, first + BATCH)):
+            seconds = rng.randint(30, 3 * 3600)
+            batch.append({
+                'id': f"v{i:010d}",
+                'channel': f"Channel {rng.choices(range(channels), cum_weights=channel_weights)[0]}",
+                'duration': seconds,
+                'title': text(rng.randint(4, 12)).capitalize(),
+                'published_at': (START - timedelta(seconds=i * step)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            })
+        db.add_videos(batch, chunk_size=BATCH)
+    ingest = time.perf_counter() - start
+
+    video_ids = [f"v{i:010d}" for i in range(videos)]
+    with_transcript = rng.sample(video_ids, int(videos * transcribed))
+    for first in range(0, len(with_transcript), BATCH // 10):
+        db.add_transcripts([(video_id, text(transcript_words), None)
+                            for video_id in with_transcript[first:first + BATCH // 10]])
+    with_summary = with_transcript[:int(videos * summarized)]
+    for first in range(0, len(with_summary), BATCH // 10):
+        db.save_job_results([(video_id, text(transcript_words // 10), {'prompt_tokens': transcript_words * 2,
+                                                                        'output_tokens': transcript_words // 5})
+                             for video_id in with_summary[first:first + BATCH // 10]], [])
+
+    # Older videos are the ones already dealt with
+    handled = int(videos * (watched + ditched))
+    conn = db._connection()
+    with conn:
+        conn.executemany("UPDATE videos SET watched = 1 WHERE id = ?",
+                         [(video_id,) for video_id in video_ids[videos - int(videos * watched):]])
+        conn.executemany("UPDATE videos SET ditched = 1 WHERE id = ?",
+                         [(video_id,) for video_id in video_ids[videos - handled:videos - int(videos * watched)]])
+    conn.execute('PRAGMA optimize')
+    db.close()
+    return {
+        'videos': videos,
+        'channels': channels,
+        'transcripts': len(with_transcript),
+        'summaries': len(with_summary),
+        'unwatched': videos - handled,
+        'ingest_s': ingest,
+        'total_s': time.perf_counter() - start,
+        'size_mb': os.path.getsize(path) / 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic faria.db, from 1k to 1M videos")
+    parser.add_argument("--output", required=True, help="Path of the new database")
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--channels", type=int, help="Default: one per 200 videos")
+    parser.add_argument("--transcribed", type=float, default=0.2, help="Share of videos with a transcript")
+    parser.add_argument("--summarized", type=float, default=0.1, help="Share of videos with a summary")
+    parser.add_argument("--transcript-words", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="Replace an existing database")
+    args = parser.parse_args()
+    if os.path.exists(args.output):
+        if not args.force:
+            sys.exit(f"{args.output} exists, pass --force to replace it")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+    stats = generate(args.output, args.videos, args.channels, args.transcribed, args.summarized,
+                     transcript_words=args.transcript_words, seed=args.seed)
+    print(', '.join(f"{key} {value:.1f}" if isinstance(value, float) else f"{key} {value}" for key, value in stats.items()))
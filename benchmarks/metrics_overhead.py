@@ -0,0 +1,51 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.summary_backlog import _seed
+from src import metrics
+from src.database import VideoDatabase
+
+
+def per_call(call, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return (time.perf_counter() - start) / calls
+
+
+def run(calls: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'metrics.db'))
+        _seed(db, 1000)
+        unwrapped = VideoDatabase.get_video.__wrapped__
+
+        def empty_timer():
+            with metrics.timer('bench', method='empty'):
+                pass
+
+        print(f"{'':<28}{'metrics off':>14}{'metrics on':>14}")
+        for name, call in (
+            ("get_video, not instrumented", lambda: unwrapped(db, 'video00500')),
+            ("get_video", lambda: db.get_video('video00500')),
+            ("empty timer() block", empty_timer),
+        ):
+            metrics.enable(False)
+            off = per_call(call, calls)
+            metrics.enable(True)
+            on = per_call(call, calls)
+            print(f"{name:<28}{off * 1e6:>11.2f} us{on * 1e6:>11.2f} us")
+
+        start = time.perf_counter()
+        metrics.flush(db)
+        print(f"flush of {len(metrics.snapshot())} metrics: {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(metrics.prometheus(metrics.load(db)).splitlines()[0])
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of the metrics wrappers with metrics off and on")
+    parser.add_argument("--calls", type=int, default=50000)
+    args = parser.parse_args()
+    run(args.calls)
@@ -0,0 +1,49 @@
+import argparse
+import os
+import tempfile
+import time
+
+from src.database import VideoDatabase
+
+
+def _seed(db: VideoDatabase, count: int) -> None:
+    batch = 10000
+    for start in range(0, count, batch):
+        db.add_videos([
+            {'id': f"video{i:07d}", 'channel': f"channel{i % 500}", 'duration': 600, 'title': f"Title {i}",
+             'published_at': f"20{10 + i % 15}-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:{i % 60:02d}Z"}
+            for i in range(start, min(count, start + batch))
+        ], chunk_size=batch)
+
+
+def _ms(fn, repeat: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def run(sizes) -> None:
+    print(f"{'backlog':>9}{'first page ms':>15}{'middle page ms':>16}{'pages':>8}")
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = VideoDatabase(os.path.join(tmp, 'pages.db'))
+            _seed(db, count)
+            first = _ms(lambda: db.get_unwatched_page())
+            # Walk the whole backlog one page at a time, holding only the current page like the lazy view
+            cursors = []
+            page = db.get_unwatched_page()
+            while page:
+                last = page[-1]
+                cursors.append((last['published_at'], last['id']))
+                page = db.get_unwatched_page(after=cursors[-1])
+            middle = cursors[len(cursors) // 2]
+            deep = _ms(lambda: db.get_unwatched_page(after=middle))
+            db.close()
+        print(f"{count:>9}{first:>15.2f}{deep:>16.2f}{len(cursors):>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keyset pagination cost vs backlog size")
+    parser.add_argument("--videos", type=int, nargs='+', default=[200, 20000, 200000])
+    args = parser.parse_args()
+    run(args.videos)
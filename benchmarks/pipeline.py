@@ -0,0 +1,108 @@
+import _thread
+import argparse
+import os
+import tempfile
+import threading
+
+from benchmarks.summary_backlog import FakeBackends, _seed
+from src.database import VideoDatabase
+from src.pipeline import Pipeline
+from src.rate_limit import QuotaExhausted
+
+
+class CountingBackends(FakeBackends):
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.summarized = 0
+        self._lock = threading.Lock()
+
+    def summarize(self, transcript: str, usage, snippets=None):
+        with self._lock:
+            self.summarized += 1
+        return super().summarize(transcript, usage)
+
+
+class QuotaBackends(CountingBackends):
+    """Summarizes quota summaries, then raises QuotaExhausted; counts the transcripts fetched after that."""
+
+    def __init__(self, *args, quota: int):
+        super().__init__(*args)
+        self.quota = quota
+        self.exhausted = False
+        self.fetched_after = 0
+
+    def fetch_transcript(self, video_id: str):
+        with self._lock:
+            self.fetched_after += self.exhausted
+        return super().fetch_transcript(video_id)
+
+    def summarize(self, transcript: str, usage, snippets=None):
+        with self._lock:
+            if self.summarized >= self.quota:
+                self.exhausted = True
+                raise QuotaExhausted("gemini: daily quota used up", 3600)
+        return super().summarize(transcript, usage)
+
+
+def _pipeline(db: VideoDatabase, backends: FakeBackends, transcript_workers: int, summary_workers: int) -> Pipeline:
+    return Pipeline(db, backends.fetch_transcript, backends.summarize,
+                    transcript_workers=transcript_workers, summary_workers=summary_workers)
+
+
+def run(videos: int, transcript_latency: float, llm_latency: float, stages) -> None:
+    print(f"{videos} videos, transcript {transcript_latency * 1000:.0f} ms, LLM {llm_latency * 1000:.0f} ms")
+    for transcript_workers, summary_workers in stages:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = VideoDatabase(os.path.join(tmp, 'pipeline.db'))
+            _seed(db, videos)
+            pipeline = _pipeline(db, FakeBackends(transcript_latency, llm_latency), transcript_workers, summary_workers)
+            pipeline.run()
+            db.close()
+        print(f"\n{transcript_workers} transcript workers, {summary_workers} summary workers")
+        print(pipeline.report())
+
+
+def run_resume(videos: int, transcript_latency: float, llm_latency: float, interrupt_after: float) -> None:
+    # Ctrl-C halfway through, then run again: the second run must only pick up what is left
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'pipeline.db'))
+        _seed(db, videos)
+        backends = CountingBackends(transcript_latency, llm_latency)
+        timer = threading.Timer(interrupt_after, _thread.interrupt_main)
+        timer.start()
+        first = _pipeline(db, backends, 4, 4)
+        first.run()
+        timer.cancel()
+        done_after_interrupt = db.count_jobs('done')
+        second = _pipeline(db, backends, 4, 4)
+        second.run()
+        print(f"\nresume: {done_after_interrupt} done when interrupted, {db.count_jobs('done')} done after resuming, "
+              f"{db.count_jobs('failed')} failed, {backends.summarized} summarize calls for "
+              f"{db.count_jobs('done')} summaries")
+        db.close()
+
+
+def run_quota(videos: int, transcript_latency: float, llm_latency: float, quota: int) -> None:
+    # Once the quota is gone the run should stop fetching and leave the rest pending, attempts untouched
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'pipeline.db'))
+        _seed(db, videos)
+        backends = QuotaBackends(transcript_latency, llm_latency, quota=quota)
+        pipeline = _pipeline(db, backends, 4, 2)
+        pipeline.run()
+        print(f"\nquota of {quota}: {db.count_jobs('done')} done, {db.count_jobs('pending')} pending, "
+              f"{db.count_jobs('running')} running in {pipeline.elapsed:.1f}s, "
+              f"{backends.fetched_after} transcripts fetched after the quota ran out")
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless pipeline throughput and resume after interruption")
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--transcript-ms", type=float, default=100)
+    parser.add_argument("--llm-ms", type=float, default=300)
+    args = parser.parse_args()
+    run(args.videos, args.transcript_ms / 1000, args.llm_ms / 1000, [(1, 1), (4, 2), (4, 8)])
+    run_resume(args.videos, args.transcript_ms / 1000, args.llm_ms / 1000, interrupt_after=2)
+    run_quota(args.videos, args.transcript_ms / 1000, args.llm_ms / 1000, quota=20)
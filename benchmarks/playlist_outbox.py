@@ -0,0 +1,101 @@
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.summary_backlog import _seed
+from src import outbox as outbox_module
+from src.database import VideoDatabase
+from src.outbox import PlaylistOutbox
+from src.rate_limit import QuotaExhausted
+
+
+class FakePlaylist:
+    """playlistItems.insert with fixed latency; every fourth video fails on its first attempt."""
+
+    def __init__(self, latency: float, quota: int = 1_000_000):
+        self.latency = latency
+        self.quota = quota
+        self.inserted = []
+        self.calls = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def insert(self, video_id: str) -> None:
+        with self._lock:
+            self.calls += 1
+            if self.quota <= 0:
+                raise QuotaExhausted("youtube: daily quota used up")
+            attempt = self._attempts[video_id] = self._attempts.get(video_id, 0) + 1
+        time.sleep(self.latency)
+        if int(video_id[len('video'):]) % 4 == 0 and attempt == 1:
+            raise RuntimeError("HTTP 503 backendError")
+        with self._lock:
+            self.quota -= 50
+            self.inserted.append(video_id)
+
+
+def wait_for(condition, timeout: float = 30) -> float:
+    start = time.perf_counter()
+    while not condition() and time.perf_counter() - start < timeout:
+        time.sleep(0.01)
+    return time.perf_counter() - start
+
+
+def run(videos: int, latency: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'outbox.db'))
+        video_ids = _seed(db, videos)
+
+        # What the keypress used to cost: the insert itself ran on the event loop
+        blocking = []
+        for _ in range(20):
+            start = time.perf_counter()
+            time.sleep(latency)
+            blocking.append(time.perf_counter() - start)
+
+        playlist = FakePlaylist(latency)
+        outbox = PlaylistOutbox(db, playlist.insert, retry_delay=0.2)
+        outbox.start()
+        queued = []
+        for video_id in video_ids:
+            start = time.perf_counter()
+            outbox.add(video_id)
+            queued.append(time.perf_counter() - start)
+        drained = wait_for(lambda: len(playlist.inserted) >= videos)
+        outbox.stop(timeout=1)
+
+        print(f"{videos} videos, {latency * 1000:.0f} ms per insert")
+        print(f"keypress, blocking insert   p50 {statistics.median(blocking) * 1000:8.2f} ms")
+        print(f"keypress, outbox add        p50 {statistics.median(queued) * 1000:8.2f} ms"
+              f"   max {max(queued) * 1000:6.2f} ms")
+        print(f"outbox drained in {drained:.2f}s: {len(set(playlist.inserted))} added, "
+              f"{playlist.calls - videos} retries")
+
+        # Quota runs out part way: the rest waits in the table and is sent after a restart
+        outbox_module.QUOTA_RETRY_DELAY = 0.5
+        playlist = FakePlaylist(latency, quota=50 * (videos // 2))
+        outbox = PlaylistOutbox(db, playlist.insert, retry_delay=0.2)
+        for video_id in video_ids:
+            outbox.add(video_id)
+        outbox.drain()
+        waiting = len(db.get_due_playlist_items(time.time() + 1, limit=videos))
+        print(f"quota exhausted after {len(playlist.inserted)} inserts, {waiting} entries postponed")
+
+        playlist.quota = 1_000_000
+        restarted = PlaylistOutbox(db, playlist.insert, retry_delay=0.2)
+        restarted.start()
+        drained = wait_for(lambda: db.get_next_playlist_attempt() is None)
+        restarted.stop(timeout=1)
+        print(f"after restart the outbox emptied in {drained:.2f}s, {len(set(playlist.inserted))} added in total")
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Playlist additions through the persistent outbox")
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+    run(args.videos, args.latency_ms / 1000)
@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+
+from src.database import (LATEST_VIDEO_DATE_QUERY, UNWATCHED_FIRST_PAGE_QUERY, UNWATCHED_NEXT_PAGE_QUERY,
+                          VideoDatabase, unwatched_query)
+
+
+# Hot queries and the index each one must be planned with
+EXPECTED_PLANS = {
+    'get_unwatched_page (first)': (
+        UNWATCHED_FIRST_PAGE_QUERY,
+        (200,),
+        'idx_videos_unwatched_keyset',
+    ),
+    'get_unwatched_page (next)': (
+        UNWATCHED_NEXT_PAGE_QUERY,
+        ('2024-01-01T00:00:30Z', 'video100', 200),
+        'idx_videos_unwatched_keyset',
+    ),
+    'get_unwatched_page (newest, max length)': (
+        unwatched_query('newest', after=True, max_length=True),
+        (600, '2024-01-01T00:00:30Z', 'video100', 200),
+        'idx_videos_unwatched_keyset',
+    ),
+    'get_unwatched_page (by length)': (
+        unwatched_query('length', after=True),
+        (600, 'video100', 200),
+        'idx_videos_unwatched_duration',
+    ),
+    'get_unwatched_page (by length, max length)': (
+        unwatched_query('length', max_length=True),
+        (600, 200),
+        'idx_videos_unwatched_duration',
+    ),
+    'get_latest_video_date_for_channel': (
+        LATEST_VIDEO_DATE_QUERY,
+        ('channel',),
+        'idx_videos_channel_published',
+    ),
+}
+
+
+def check_plans(db: VideoDatabase) -> bool:
+    conn = db._connection()
+    conn.execute('ANALYZE')
+    ok = True
+    for name, (query, parameters, index) in EXPECTED_PLANS.items():
+        plan = " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", parameters))
+        uses_index = index in plan and 'TEMP B-TREE' not in plan
+        ok = ok and uses_index
+        print(f"{'ok' if uses_index else 'FAIL':<5}{name}: {plan}")
+    return ok
+
+
+def run(rows: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'plans.db'))
+        db.add_videos([
+            {'id': f"video{i}", 'channel': f"channel{i % 100}", 'duration': 30 + i * 7 % 7200,
+             'title': f"Title {i}", 'published_at': f"2024-01-01T00:00:{i % 60:02d}Z"}
+            for i in range(rows)
+        ])
+        ok = check_plans(db)
+        db.close()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run(5000) else 1)
@@ -0,0 +1,95 @@
+import argparse
+import itertools
+import os
+import random
+import string
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from src.database import VideoDatabase
+
+
+VOCABULARY = 20000
+
+
+def _vocabulary(rng: random.Random) -> List[str]:
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(VOCABULARY)]
+
+
+def _queries(words: List[str]) -> List[Tuple[str, str]]:
+    # Word frequency follows Zipf's law, so rank 0 is in every transcript like "the" and rank 5000 in a few
+    return [
+        ('stopword', words[0]),
+        ('common', words[20]),
+        ('medium', words[300]),
+        ('rare', words[5000]),
+        ('two words', f"{words[300]} {words[5000]}"),
+        ('typing', words[5000][:3]),
+        ('channel', 'channel7'),
+    ]
+
+
+def _seed(db: VideoDatabase, count: int, transcript_words: int, words: List[str], rng: random.Random) -> float:
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+    def _text(length: int) -> str:
+        return ' '.join(rng.choices(words, cum_weights=weights, k=length))
+
+    batch = 10000
+    for start in range(0, count, batch):
+        db.add_videos([
+            {'id': f"video{i:07d}", 'channel': f"channel{i % 500}", 'duration': 600, 'title': f"Title {i} {_text(6)}",
+             'published_at': f"20{10 + i % 15}-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:{i % 60:02d}Z"}
+            for i in range(start, min(count, start + batch))
+        ], chunk_size=batch)
+    start = time.perf_counter()
+    for i in range(count):
+        db.add_transcription(f"video{i:07d}", _text(transcript_words))
+        if i % 4 == 0:
+            db.add_summary(f"video{i:07d}", _text(transcript_words // 10))
+    return time.perf_counter() - start
+
+
+def _sizes(db: VideoDatabase) -> Dict[str, float]:
+    # MB on disk of the search index, of the compressed texts and of everything else
+    conn = db._connection()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    sizes = {'search index': 0.0, 'texts': 0.0, 'rest': 0.0}
+    for name, size in conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"):
+        part = ('search index' if name.startswith('videos_fts')
+                else 'texts' if name in ('transcripts', 'summaries') else 'rest')
+        sizes[part] += size / 1e6
+    return sizes
+
+
+def _ms(fn, repeat: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def run(count: int, transcript_words: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'search.db'))
+        rng = random.Random(count)
+        words = _vocabulary(rng)
+        seconds = _seed(db, count, transcript_words, words, rng)
+        print(f"indexed {count} videos with {transcript_words}-word transcripts in {seconds:.1f}s "
+              f"({count / seconds:.0f} transcripts/s)")
+        sizes = _sizes(db)
+        print(f"{sum(sizes.values()):.1f} MB: " + ", ".join(f"{part} {mb:.1f} MB" for part, mb in sizes.items()))
+        print(f"{'query':<12}{'text':<20}{'matches':>9}{'ms':>9}")
+        for name, query in _queries(words):
+            matches = len(db.search(query, limit=count))
+            print(f"{name:<12}{query:<20}{matches:>9}{_ms(lambda: db.search(query)):>9.2f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text search latency over a synthetic library")
+    parser.add_argument("--videos", type=int, default=100000)
+    parser.add_argument("--transcript-words", type=int, default=300)
+    args = parser.parse_args()
+    run(args.videos, args.transcript_words)
@@ -0,0 +1,56 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from src.utils import project_root
+
+
+# None of these may be imported before a command needs them
+HEAVY_MODULES = ('textual', 'google.generativeai', 'google.api_core', 'googleapiclient', 'google_auth_oauthlib',
+                 'google_auth_httplib2', 'youtube_transcript_api', 'src.database')
+
+LOADED_MODULES = f'''
+import runpy, sys
+sys.argv = ['main.py', '--help']
+try:
+    runpy.run_path('main.py', run_name='__main__')
+except SystemExit:
+    pass
+print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)
+'''
+
+
+def time_help(runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'main.py', '--help'], cwd=project_root(), check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def loaded_modules() -> list:
+    result = subprocess.run([sys.executable, '-c', LOADED_MODULES], cwd=project_root(), check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return result.stderr.split()
+
+
+def run(runs: int, max_ms: float) -> bool:
+    median = time_help(runs)
+    loaded = loaded_modules()
+    print(f"main.py --help: median {median * 1000:.0f} ms over {runs} runs (budget {max_ms:.0f} ms)")
+    print(f"heavy modules imported: {', '.join(loaded) or 'none'}")
+    ok = median * 1000 <= max_ms and not loaded
+    print("OK" if ok else "REGRESSION")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup time of main.py --help; exits 1 when it regresses")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=400, help="Budget for the median wall time, interpreter included")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.runs, args.max_ms) else 1)
@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+from benchmarks.fake_backends import FakeGemini, FakeTranscripts
+from benchmarks.fake_youtube import FakeYouTube
+from benchmarks.generate_db import generate
+from benchmarks.table_render import TableApp
+from src import youtube_user
+from src.database import VideoDatabase
+from src.pipeline import Pipeline
+from src.rate_limit import RateLimiter, set_limiter
+from src.transcripts import TranscriptFetcher
+from src.utils import project_root
+
+
+# Metric names end in their unit; for these suffixes a higher value is better, for _s and _ms a lower one
+HIGHER_IS_BETTER = ('_per_s', '_per_min')
+LOWER_IS_BETTER = ('_s', '_ms')
+
+
+def _ms(call: Callable[[], Any], seconds: float = 2, repeat: int = 50) -> float:
+    # The fastest median of back-to-back rounds of single calls over a couple of seconds: under a
+    # millisecond a mean of a few calls moves with every hiccup of the machine, enough to fail the
+    # 20% check of --compare
+    call()
+    medians = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - start)
+        medians.append(statistics.median(timings))
+    return min(medians) * 1000
+
+
+def feed_refresh(tmp: str, args) -> Dict[str, Any]:
+    # The [RateLimit] budget would be what gets measured, not the crawler
+    set_limiter('youtube', RateLimiter('youtube'))
+    db = VideoDatabase(os.path.join(tmp, 'feed.db'))
+    youtube = FakeYouTube(channels=args.channels, videos_per_channel=args.videos_per_channel,
+                          latency=args.api_latency, page_size=args.page_size)
+    start = time.perf_counter()
+    feed = youtube_user.get_subscription_feed(youtube, db, workers=args.feed_workers, mode='api')
+    full = time.perf_counter() - start
+    requests = sum(youtube.calls.values())
+
+    youtube_user.sync_subscription_feed(youtube, db, chunk_size=500, workers=args.feed_workers, mode='api')
+    for channel_index in range(min(5, args.channels)):
+        youtube.upload(channel_index)
+    youtube.calls.clear()
+    start = time.perf_counter()
+    youtube_user.sync_subscription_feed(youtube, db, chunk_size=500, workers=args.feed_workers, mode='api')
+    incremental = time.perf_counter() - start
+    db.close()
+    return {
+        'videos': len(feed),
+        'full_refresh_s': full,
+        'full_refresh_requests': requests,
+        'incremental_sync_s': incremental,
+        'incremental_sync_requests': sum(youtube.calls.values()),
+    }
+
+
+def ingest(tmp: str, args) -> Dict[str, Any]:
+    db = VideoDatabase(os.path.join(tmp, 'ingest.db'))
+    videos = [
+        {'id': f"v{i:010d}", 'channel': f"Channel {i % 500}", 'duration': 600, 'title': f"Title {i}",
+         'published_at': f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z"}
+        for i in range(args.videos)
+    ]
+    start = time.perf_counter()
+    db.add_videos(videos)
+    inserted = time.perf_counter() - start
+    start = time.perf_counter()
+    db.add_videos([dict(video, title=video['title'] + ' (updated)') for video in videos])
+    updated = time.perf_counter() - start
+    start = time.perf_counter()
+    db.add_videos(videos[:args.videos // 10])
+    unchanged = time.perf_counter() - start
+    db.close()
+    return {
+        'insert_videos_per_s': args.videos / inserted,
+        'update_videos_per_s': args.videos / updated,
+        'unchanged_videos_per_s': args.videos // 10 / unchanged,
+    }
+
+
+async def _render(videos, repeat: int = 10) -> float:
+    from src.tui import sync_table
+    app = TableApp()
+    async with app.run_test() as pilot:
+        table = app.query_one('DataTable')
+        timings = []
+        for _ in range(repeat):
+            table.clear()
+            await pilot.pause()
+            start = time.perf_counter()
+            sync_table(table, [], videos)
+            await pilot.pause()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+
+def unwatched_list(tmp: str, args) -> Dict[str, Any]:
+    path = os.path.join(tmp, 'library.db')
+    library = generate(path, args.videos, transcribed=0.05, summarized=0.02, transcript_words=50)
+    db = VideoDatabase(path)
+    first = db.get_unwatched_videos()
+    last = first[-1]
+    result = {
+        'library_videos': library['videos'],
+        'first_page_ms': _ms(db.get_unwatched_videos),
+        'next_page_ms': _ms(lambda: db.get_unwatched_page(after=(last['published_at'], last['id']))),
+        'render_first_page_ms': asyncio.run(_render(first)),
+    }
+    db.close()
+    return result
+
+
+def summary_backlog(tmp: str, args) -> Dict[str, Any]:
+    db = VideoDatabase(os.path.join(tmp, 'backlog.db'))
+    db.add_videos([{'id': f"v{i:010d}", 'channel': 'Channel', 'duration': 600, 'title': f"Title {i}",
+                    'published_at': f"2024-01-01T00:00:{i % 60:02d}Z"} for i in range(args.backlog)])
+    transcripts = FakeTranscripts(args.transcript_latency)
+    gemini = FakeGemini(args.llm_latency)
+    pipeline = Pipeline(db, TranscriptFetcher(db, transcripts.fetch).get, gemini.summarize,
+                        transcript_workers=4, summary_workers=args.summary_workers)
+    stats = pipeline.run()
+    db.close()
+    summarized = stats['summaries'].succeeded
+    return {
+        'videos': args.backlog,
+        'summarized': summarized,
+        'no_transcript': stats['transcripts'].failed,
+        'wall_s': pipeline.elapsed,
+        'summarized_per_min': summarized / (pipeline.elapsed / 60),
+        'prompt_tokens': gemini.prompt_tokens,
+    }
+
+
+SCENARIOS = {
+    'feed_refresh': feed_refresh,
+    'ingest': ingest,
+    'unwatched_list': unwatched_list,
+    'summary_backlog': summary_backlog,
+}
+
+
+def _environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root(),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    results = {'environment': _environment(), 'parameters': vars(args).copy(), 'scenarios': {}}
+    for name in args.scenarios:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            results['scenarios'][name] = SCENARIOS[name](tmp, args)
+        print(f"{name:<16}{time.perf_counter() - start:6.1f}s  "
+              + ', '.join(f"{key} {value:.4g}" for key, value in results['scenarios'][name].items()), file=sys.stderr)
+    return results
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Any], tolerance: float) -> bool:
+    """Print every timing next to the baseline's, returns False if one got worse by more than tolerance."""
+    ok = True
+    print(f"{'metric':<42}{'baseline':>12}{'now':>12}{'change':>9}")
+    for scenario, metrics in results['scenarios'].items():
+        for metric, value in metrics.items():
+            old = baseline.get('scenarios', {}).get(scenario, {}).get(metric)
+            if not old or not metric.endswith(HIGHER_IS_BETTER + LOWER_IS_BETTER):
+                continue
+            change = value / old - 1
+            worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+            flag = '  REGRESSION' if worse > tolerance else ''
+            ok = ok and not flag
+            print(f"{scenario + '.' + metric:<42}{old:>12.4g}{value:>12.4g}{change:>+8.0%}{flag}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite on fake YouTube, transcript and Gemini backends")
+    parser.add_argument("--scenarios", nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="How much worse a metric may get before the comparison fails")
+    parser.add_argument("--videos", type=int, default=10000, help="Library size for ingest and the video list")
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--videos-per-channel", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50, help="Items per page of the fake Data API")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="Seconds per fake Data API request")
+    parser.add_argument("--feed-workers", type=int, default=8)
+    parser.add_argument("--backlog", type=int, default=100, help="Videos to summarize")
+    parser.add_argument("--transcript-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--summary-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            sys.exit(0 if compare(json.load(file), results, args.tolerance) else 1)
@@ -0,0 +1,86 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from src.database import VideoDatabase
+from src.jobs import SummaryWorkerPool
+
+
+class FakeBackends:
+    """Transcript and LLM stand-ins with fixed latency; every fifth video has no transcript."""
+
+    def __init__(self, transcript_latency: float, llm_latency: float):
+        self.transcript_latency = transcript_latency
+        self.llm_latency = llm_latency
+
+    def fetch_transcript(self, video_id: str):
+        time.sleep(self.transcript_latency)
+        if video_id.endswith(('0', '5')):
+            return None
+        return f"transcript of {video_id} " * 200
+
+    def summarize(self, transcript: str, usage, snippets=None):
+        time.sleep(self.llm_latency)
+        usage.update(prompt_tokens=len(transcript) // 4, output_tokens=10)
+        return f"summary of {transcript[:30]}"
+
+
+def _seed(db: VideoDatabase, count: int):
+    db.add_videos([
+        {'id': f"video{i:05d}", 'channel': 'channel', 'duration': 600,
+         'title': f"Title {i}", 'published_at': f"2024-01-01T00:00:{i % 60:02d}Z"}
+        for i in range(count)
+    ])
+    return [f"video{i:05d}" for i in range(count)]
+
+
+def _drain(db: VideoDatabase, backends: FakeBackends, video_ids, workers: int, stop_after=None) -> float:
+    done = threading.Semaphore(0)
+    pool = SummaryWorkerPool(db, backends.fetch_transcript, backends.summarize, workers=workers,
+                             on_done=lambda video_id: done.release(), retry_delay=0)
+    start = time.perf_counter()
+    pool.start()
+    pool.submit(video_ids)
+    while db.count_jobs('pending') or db.count_jobs('running'):
+        if stop_after is not None and db.count_jobs('done') >= stop_after:
+            break
+        done.acquire(timeout=0.05)
+    pool.stop()
+    return time.perf_counter() - start
+
+
+def run(videos: int, transcript_latency: float, llm_latency: float, worker_counts) -> None:
+    print(f"{videos} videos, transcript {transcript_latency * 1000:.0f} ms, LLM {llm_latency * 1000:.0f} ms")
+    print(f"{'workers':>8}{'wall s':>10}{'videos/min':>12}{'done':>6}{'failed':>8}")
+    backends = FakeBackends(transcript_latency, llm_latency)
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = VideoDatabase(os.path.join(tmp, 'backlog.db'))
+            video_ids = _seed(db, videos)
+            elapsed = _drain(db, backends, video_ids, workers)
+            done, failed = db.count_jobs('done'), db.count_jobs('failed')
+            db.close()
+        print(f"{workers:>8}{elapsed:>10.2f}{done / elapsed * 60:>12.0f}{done:>6}{failed:>8}")
+
+    # Interrupt halfway, then resume with a new pool on the same database
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VideoDatabase(os.path.join(tmp, 'backlog.db'))
+        video_ids = _seed(db, videos)
+        _drain(db, backends, video_ids, max(worker_counts), stop_after=videos // 3)
+        interrupted = db.count_jobs('done')
+        _drain(db, backends, video_ids, max(worker_counts))
+        print(f"resume: {interrupted} done before the interruption, {db.count_jobs('done')} after resuming, "
+              f"{db.count_jobs('pending') + db.count_jobs('running')} left")
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summary backlog throughput with fake transcript and LLM backends")
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--transcript-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    run(args.videos, args.transcript_latency, args.llm_latency, args.workers)
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import sys
+import time
+
+from textual.app import App, ComposeResult
+from textual.widgets import DataTable
+
+from src.tui import COLUMNS, sync_table, update_flag_cells, video_cells
+
+
+def _videos(count: int):
+    return [
+        {'id': f"video{i:06d}", 'channel': f"channel{i % 50}", 'duration': 600, 'title': f"Title {i}",
+         'has_transcript': i % 2, 'has_summary': i % 3 == 0}
+        for i in range(count)
+    ]
+
+
+class TableApp(App):
+    def compose(self) -> ComposeResult:
+        yield DataTable(cursor_type='row')
+
+    def on_mount(self) -> None:
+        table = self.query_one(DataTable)
+        for label, key in COLUMNS:
+            table.add_column(label, key=key)
+
+
+async def _timed(pilot, action) -> float:
+    # Includes one screen update, which is what the user waits for
+    start = time.perf_counter()
+    action()
+    await pilot.pause()
+    return (time.perf_counter() - start) * 1000
+
+
+async def measure(count: int):
+    videos = _videos(count)
+    app = TableApp()
+    async with app.run_test() as pilot:
+        table = app.query_one(DataTable)
+        sync_table(table, [], videos)
+        await pilot.pause()
+        table.move_cursor(row=count // 2)
+
+        def rebuild():
+            # What task_get_videos used to do after every ditch, watch or summary
+            table.clear()
+            for video in videos:
+                table.add_row(*video_cells(video), key=video['id'])
+
+        remaining = [video for video in videos if video['id'] != videos[count // 2]['id']]
+        summarized = dict(videos[count // 2 + 1], has_summary=True, has_transcript=True)
+        # A refresh brings newer videos, which belong at the top of the list
+        refreshed = [dict(video, id=f"new{video['id']}") for video in _videos(20)] + remaining
+        # Sorting by length puts the same rows in another order
+        reordered = sorted(refreshed, key=lambda video: video['channel'])
+        timings = (
+            await _timed(pilot, rebuild),
+            await _timed(pilot, lambda: sync_table(table, videos, remaining)),
+            await _timed(pilot, lambda: update_flag_cells(table, summarized)),
+            await _timed(pilot, lambda: sync_table(table, remaining, refreshed)),
+            await _timed(pilot, lambda: sync_table(table, refreshed, reordered)),
+        )
+        shown = [table.coordinate_to_cell_key((row, 0)).row_key.value for row in range(table.row_count)]
+        return timings, shown == [video['id'] for video in reordered]
+
+
+def run(sizes) -> bool:
+    print(f"{'rows':>8}{'rebuild ms':>12}{'remove row ms':>15}{'update cells ms':>17}{'refresh +20 ms':>16}"
+          f"{'reorder ms':>12}")
+    ok = True
+    for count in sizes:
+        (rebuild, remove, update, refresh, reorder), in_order = asyncio.run(measure(count))
+        ok = ok and in_order
+        print(f"{count:>8}{rebuild:>12.1f}{remove:>15.1f}{update:>17.1f}{refresh:>16.1f}{reorder:>12.1f}"
+              f"{'' if in_order else '  FAIL: rows out of list order'}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Video table redraw time: full rebuild vs incremental updates")
+    parser.add_argument("--rows", type=int, nargs='+', default=[200, 2000, 20000])
+    args = parser.parse_args()
+    sys.exit(0 if run(args.rows) else 1)
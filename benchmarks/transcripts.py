@@ -0,0 +1,36 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fake_backends import FakeTranscripts
+from benchmarks.summary_backlog import _seed
+from src.database import VideoDatabase
+from src.transcripts import TranscriptFetcher
+
+
+def run(videos: int, latency: float, worker_counts) -> None:
+    print(f"{videos} videos, {latency * 1000:.0f} ms per transcript")
+    print(f"{'workers':>8}{'wall s':>10}{'stored':>8}{'requests':>10}{'2nd pass requests':>19}")
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = VideoDatabase(os.path.join(tmp, 'transcripts.db'))
+            video_ids = _seed(db, videos)
+            source = FakeTranscripts(latency)
+            fetcher = TranscriptFetcher(db, source.fetch, workers=workers)
+            start = time.perf_counter()
+            stored = fetcher.prefetch(video_ids)
+            wall = time.perf_counter() - start
+            first_calls = source.calls
+            # Stored transcripts and failures still within their retry_after cost no requests
+            fetcher.prefetch(video_ids)
+            db.close()
+        print(f"{workers:>8}{wall:>10.2f}{len(stored):>8}{first_calls:>10}{source.calls - first_calls:>19}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent transcript prefetch and the negative cache")
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+    run(args.videos, args.latency_ms / 1000, [1, 4, 16])
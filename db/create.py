@@ -1,30 +1,18 @@
-import sqlite3
+import os
+import sys
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-def truncate_videos_table():
-    conn = sqlite3.connect('./db/faria.db')
+from src.database import VideoDatabase  # noqa: E402
+
+
+def create_tables():
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS videos (
-                id TEXT PRIMARY KEY,
-                channel TEXT NOT NULL,
-                duration TEXT,
-                title TEXT NOT NULL,
-                transcription TEXT,
-                summary TEXT,
-                watched INTEGER DEFAULT 0,
-                disliked INTEGER DEFAULT 0,
-                published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        db = VideoDatabase('./db/faria.db')
+        db.close()
     except Exception as e:
-        print(f"Error truncating videos table: {e}")
-    finally:
-        conn.close()
+        print(f"Error creating tables: {e}")
 
 
 if __name__ == "__main__":
-    truncate_videos_table()
+    create_tables()
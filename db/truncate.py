@@ -1,11 +1,24 @@
+import os
 import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.migrations import register_functions  # noqa: E402
 
 
 def truncate_videos_table():
     conn = sqlite3.connect('./db/faria.db')
     try:
+        # The search index triggers read the texts of the deleted videos through inflate()
+        register_functions(conn)
+        # Off by default; with it on, deleting videos also deletes their transcripts, summaries,
+        # jobs, transcript failures and playlist outbox entries
+        conn.execute('PRAGMA foreign_keys = ON')
         cursor = conn.cursor()
         cursor.execute('DELETE FROM videos')
+        # The per-channel cursors and ETags would make the next sync skip everything deleted here
+        cursor.execute('DELETE FROM sync_state')
         conn.commit()
     except Exception as e:
         print(f"Error truncating videos table: {e}")
@@ -1,23 +1,95 @@
-from src.gemini_api import extended_summarize_text, get_youtube_transcript
+from src import metrics, startup
 from src.logger import setup_logger
-from src.tui import VideoApp
-from src.youtube_auth import get_authenticated_service
-from src.youtube_user import get_subscription_feed
+from src.utils import get_conf
 import argparse
+import sys
+import time
+
+# Each command imports what it needs when it runs: the TUI, Google and Gemini client
+# libraries take most of the startup time, and --help or --search need none of them
 
 
 def get_videos():
+    from src.database import VideoDatabase
+    from src.youtube_auth import get_authenticated_service
+    from src.youtube_user import get_subscription_feed
     youtube = get_authenticated_service()
-    videos = get_subscription_feed(youtube)
+    videos = get_subscription_feed(youtube, VideoDatabase())
     print(videos)
 
 def get_summary(video_id):
-    transcript = get_youtube_transcript(video_id)
-    summary = extended_summarize_text(transcript)
+    from src.gemini_api import extended_summarize_text, get_youtube_transcript_snippets
+    from src.rate_limit import QuotaExhausted
+    from src.transcripts import join_snippets
+    startup.mark('imports')
+    snippets = get_youtube_transcript_snippets(video_id)
+    transcript = join_snippets(snippets) if snippets else None
+    try:
+        summary = extended_summarize_text(transcript, snippets=[snippet['text'] for snippet in snippets or ()])
+    except QuotaExhausted as e:
+        summary = f"{e}, it resets in {e.retry_after / 3600:.1f}h"
     print(summary)
+    startup.mark('summarize')
+
+def search(query):
+    from src.database import VideoDatabase
+    startup.mark('imports')
+    db = VideoDatabase()
+    startup.mark('open database')
+    for video in db.search(query):
+        print(f"{video['id']}  {video['channel']} - {video['title']}")
+        print(f"    {video['snippet']}".replace("\n", " "))
+    startup.mark('search')
+
+def sync_feed():
+    from src.database import VideoDatabase
+    from src.youtube_auth import get_authenticated_service
+    from src.youtube_user import sync_subscription_feed
+    startup.mark('imports')
+    youtube = get_authenticated_service()
+    startup.mark('authenticate')
+    if youtube is None:
+        print("Could not authenticate with YouTube")
+        return False
+    start = time.perf_counter()
+    stats = sync_subscription_feed(youtube, VideoDatabase(), int(get_conf('Database', 'insert_chunk_size')))
+    print(f"sync        {time.perf_counter() - start:.1f}s {stats}")
+    startup.mark('sync')
+    return True
+
+def process_backlog(limit):
+    from src.database import VideoDatabase
+    from src.gemini_api import summarize_text
+    from src.pipeline import Pipeline
+    from src.transcripts import TranscriptFetcher
+    startup.mark('imports')
+    db = VideoDatabase()
+    pipeline = Pipeline(
+        db,
+        TranscriptFetcher(db).get,
+        summarize_text,
+        transcript_workers=int(get_conf('Pipeline', 'transcript_workers')),
+        summary_workers=int(get_conf('Pipeline', 'summary_workers')),
+        batch_size=int(get_conf('Pipeline', 'batch_size')),
+    )
+    pipeline.run(limit)
+    print(pipeline.report())
+    startup.mark('process')
+
+def show_stats():
+    from src.database import VideoDatabase
+    stats = metrics.load(VideoDatabase())
+    print(metrics.report(stats) if stats else "No metrics recorded yet")
+
+def save_metrics():
+    if metrics.pending():
+        from src.database import VideoDatabase
+        metrics.flush(VideoDatabase())
 
-def run_tui():
-    app = VideoApp()
+def run_tui(profile_startup=False):
+    from src.tui import VideoApp
+    startup.mark('import tui')
+    app = VideoApp(profile_startup=profile_startup)
     app.run()
 
 if __name__ == "__main__":
@@ -25,12 +97,37 @@ if __name__ == "__main__":
     
     parser.add_argument("--tui", action="store_true", help="Run the TUI application")
     parser.add_argument("--summarize", help="Summarize the video")
+    parser.add_argument("--search", help="Search titles, channels, transcripts and summaries")
+    parser.add_argument("--sync", action="store_true", help="Fetch new videos from the subscriptions, without the TUI")
+    parser.add_argument("--process", action="store_true", help="Fetch transcripts and summarize the backlog, without the TUI")
+    parser.add_argument("--limit", type=int, help="Process at most this many videos")
+    parser.add_argument("--stats", action="store_true", help="Show latency and usage metrics summed over every run")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print how long each startup phase took; with --tui, quit once the list is shown")
     args = parser.parse_args()
+    startup.mark('arguments')
 
     setup_logger()
-    if args.tui:
-        run_tui()
-    elif args.summarize:
-        get_summary(args.summarize)
-    else:
-        parser.print_help()
+    metrics.setup()
+    startup.mark('logger')
+    try:
+        if args.tui:
+            run_tui(args.profile_startup)
+        elif args.summarize:
+            get_summary(args.summarize)
+        elif args.search:
+            search(args.search)
+        elif args.stats:
+            show_stats()
+        elif args.sync or args.process:
+            if args.sync and not sync_feed():
+                sys.exit(1)
+            if args.process:
+                process_backlog(args.limit)
+        else:
+            parser.print_help()
+    finally:
+        # Saved even when a command fails or is interrupted
+        save_metrics()
+    if args.profile_startup:
+        print(startup.report(), file=sys.stderr)
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+
+# Rough average for English and Italian text, good enough to size chunks
+CHARS_PER_TOKEN = 4
+
+
+def split_into_chunks(pieces: List[str], token_budget: int) -> List[str]:
+    """Greedily join consecutive pieces (transcript snippets or words) into chunks under token_budget.
+
+    Pieces are never split, so a chunk boundary always falls between two snippets.
+    """
+    max_chars = token_budget * CHARS_PER_TOKEN
+    chunks = []
+    current: List[str] = []
+    size = 0
+    for piece in pieces:
+        if current and size + len(piece) + 1 > max_chars:
+            chunks.append(" ".join(current))
+            current = []
+            size = 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def summarize_chunks(chunks: List[str], generate: Callable[[str, str], str], chunk_prompt_id: str,
+                     workers: int) -> List[str]:
+    """Map step: summarize every chunk with at most `workers` model calls in flight, in chunk order."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda chunk: generate(chunk, chunk_prompt_id), chunks))
+
+
+def join_partials(partials: List[str]) -> str:
+    """Input for the reduce step: the partial summaries, labelled in transcript order."""
+    return "\n\n".join(f"Part {i} of {len(partials)}:\n{partial}" for i, partial in enumerate(partials, start=1))
+
+
+def summarize_chunked(pieces: List[str], generate: Callable[[str, str], str], prompt_id: str,
+                      chunk_prompt_id: str, reduce_prompt_id: str, token_budget: int, workers: int) -> str:
+    """Map-reduce summary: summarize each chunk in parallel, then summarize the partial summaries.
+
+    generate(text, prompt_id) returns the model output for a prompt template applied to
+    text. A transcript that fits in one chunk is summarized directly with prompt_id.
+    """
+    chunks = split_into_chunks(pieces, token_budget)
+    if len(chunks) <= 1:
+        return generate(" ".join(chunks), prompt_id)
+
+    partials = summarize_chunks(chunks, generate, chunk_prompt_id, workers)
+    return generate(join_partials(partials), reduce_prompt_id)
@@ -1,42 +1,223 @@
+import json
 import logging
+import os
+import re
+import socket
 import sqlite3
+import threading
+import time
+import uuid
+import weakref
+import zlib
 from typing import List, Dict, Optional, Any, Tuple
 
+from src import metrics
+from src.migrations import migrate, register_functions
 
+
+# Applied to every connection when it is opened. WAL lets the TUI read while a
+# worker thread writes, and synchronous=NORMAL drops the fsync on each commit.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA foreign_keys = ON',
+)
+STATEMENT_CACHE_SIZE = 256
+DEFAULT_CHUNK_SIZE = 500
+PAGE_SIZE = 200
+
+# Everything the video list needs; transcripts and summaries live in their own
+# compressed tables and are loaded one at a time with get_transcription/get_summary.
+LIST_COLUMNS = '''
+    v.id, v.channel, v.duration, v.title, v.watched, v.ditched, v.published_at,
+    EXISTS(SELECT 1 FROM transcripts t WHERE t.video_id = v.id) AS has_transcript,
+    EXISTS(SELECT 1 FROM summaries s WHERE s.video_id = v.id) AS has_summary
+'''
+# Orders the unwatched list is paged in: the columns of the page key, the keyset condition that
+# continues after the last row of a page, the sort, the rows the order leaves out and the max
+# length condition. Each is a range scan on a partial index, however deep. Videos YouTube reports
+# no length for, like upcoming premieres, have a duration of 0: sorting by length and a max length
+# leave them out. Newest first, the unary + keeps the planner walking the keyset index, which
+# carries duration to filter on, rather than fetching every short enough video to sort them.
+UNWATCHED_ORDERS = {
+    'newest': {
+        'key': ('published_at', 'id'),
+        'after': '(v.published_at, v.id) < (?, ?)',
+        'order_by': 'v.published_at DESC, v.id DESC',
+        'where': None,
+        'max_length': '+v.duration BETWEEN 1 AND ?',
+    },
+    'length': {
+        'key': ('duration', 'id'),
+        'after': '(v.duration, v.id) > (?, ?)',
+        'order_by': 'v.duration, v.id',
+        'where': 'v.duration > 0',
+        'max_length': 'v.duration <= ?',
+    },
+}
+
+
+def unwatched_query(order: str = 'newest', after: bool = False, max_length: bool = False) -> str:
+    """The page query of get_unwatched_page; its parameters are max_length, the page key and the limit, in that order."""
+    spec = UNWATCHED_ORDERS[order]
+    conditions = ['v.watched = 0', 'v.ditched = 0']
+    if max_length:
+        conditions.append(spec['max_length'])
+    if after:
+        # Implies where, the page key being a listed row; with both the planner may seek on where instead
+        conditions.append(spec['after'])
+    elif spec['where']:
+        conditions.append(spec['where'])
+    return f'''
+SELECT {LIST_COLUMNS} FROM videos v
+WHERE {' AND '.join(conditions)}
+ORDER BY {spec['order_by']} LIMIT ?
+'''
+
+
+def page_key(video: Dict[str, Any], order: str = 'newest') -> Tuple[Any, str]:
+    """What get_unwatched_page takes as after to continue the list past video."""
+    return tuple(video[column] for column in UNWATCHED_ORDERS[order]['key'])
+
+
+UNWATCHED_FIRST_PAGE_QUERY = unwatched_query()
+UNWATCHED_NEXT_PAGE_QUERY = unwatched_query(after=True)
+# The FTS query is ranked and limited on its own, so only the top matches are joined back to videos
+SEARCH_QUERY = f'''
+SELECT {LIST_COLUMNS}, m.snippet FROM (
+    SELECT rowid, rank, snippet(videos_fts, -1, ?, ?, '…', 12) AS snippet
+    FROM videos_fts WHERE videos_fts MATCH ? ORDER BY rank LIMIT ?
+) m JOIN videos v ON v.rowid = m.rowid
+ORDER BY m.rank
+'''
+SEARCH_LIMIT = 50
+# videos_fts reads the texts through videos_search and keeps no copy: an entry is removed with
+# the text it was made of, so a video's entry is taken out before its transcript or summary changes
+SEARCH_INDEX_DELETE_QUERY = '''
+INSERT INTO videos_fts(videos_fts, rowid, title, channel, transcript, summary)
+SELECT 'delete', video_rowid, title, channel, transcript, summary FROM videos_search WHERE video_rowid = ?
+'''
+SEARCH_INDEX_INSERT_QUERY = '''
+INSERT INTO videos_fts(rowid, title, channel, transcript, summary)
+SELECT video_rowid, title, channel, transcript, summary FROM videos_search WHERE video_rowid = ?
+'''
+LATEST_VIDEO_DATE_QUERY = 'SELECT MAX(published_at) FROM videos WHERE channel = ?'
+
+UPSERT_VIDEO_QUERY = '''
+INSERT INTO videos(id, channel, duration, title, published_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    channel = excluded.channel,
+    duration = excluded.duration,
+    title = excluded.title,
+    published_at = excluded.published_at
+WHERE videos.channel IS NOT excluded.channel
+    OR videos.duration IS NOT excluded.duration
+    OR videos.title IS NOT excluded.title
+    OR videos.published_at IS NOT excluded.published_at
+'''
+
+# Jobs of watched or ditched videos stay pending but are never picked, their summaries would only use up the Gemini budget
+PENDING_JOBS_QUERY = '''
+SELECT j.video_id FROM jobs j JOIN videos v ON v.id = j.video_id
+WHERE j.state = 'pending' AND v.watched = 0 AND v.ditched = 0
+'''
+# Processes that claim jobs refresh their heartbeat this often, in seconds; a claim not refreshed
+# for STALE_CLAIM_SECONDS is abandoned, like one whose process on this machine is gone
+CLAIM_HEARTBEAT_SECONDS = 60
+STALE_CLAIM_SECONDS = 5 * CLAIM_HEARTBEAT_SECONDS
+# A claimed job that could not be run goes back to pending, without the claim counting as an attempt
+RELEASE_JOB_QUERY = '''
+UPDATE jobs SET state = 'pending', attempts = MAX(attempts - 1, 0), updated_at = CURRENT_TIMESTAMP
+WHERE video_id = ? AND state = 'running'
+'''
+
+
+def _match_query(text: str) -> str:
+    # Words are quoted so FTS5 syntax in user input is taken literally. The last one is matched
+    # as a prefix, so results show up while it is still being typed.
+    words = re.findall(r'\w+', text)
+    terms = [f'"{word}"' for word in words]
+    if terms and not text[-1].isspace():
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def new_claim_owner() -> str:
+    """Who claims jobs, as host:pid:token; the token tells apart two claimers in one process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _claim_abandoned(owner: str) -> bool:
+    # Only a process on this machine can be checked; elsewhere the heartbeat decides
+    host, _, rest = owner.partition(':')
+    pid = rest.partition(':')[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class _ThreadConnection:
+    """A thread's connection, held only by its threading.local: when the thread exits the local
+    drops it and the connection is closed."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        weakref.finalize(self, conn.close)
+
+
+# Every public method is timed as db_call{method="..."} when metrics are on. Storing the
+# metrics is not, or saving them would always leave something new to save.
+@metrics.instrument('db_call', exclude=('add_metrics', 'get_metrics'))
 class VideoDatabase:
     def __init__(self, db_path: str = "db/faria.db"):
         self.db_path = db_path
-        self._create_tables_if_not_exist()
         self.logger = logging.getLogger('faria_logger')
+        self._local = threading.local()
+        self._connections: 'weakref.WeakSet[_ThreadConnection]' = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        self._create_tables_if_not_exist()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, for as long as the thread lives: the Textual event loop and
+        # each worker thread get their own, so no connection is shared concurrently, and those
+        # of short-lived executor threads are closed when the threads exit.
+        holder = getattr(self._local, 'conn', None)
+        if holder is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+            conn.row_factory = sqlite3.Row
+            register_functions(conn)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            holder = _ThreadConnection(conn)
+            self._local.conn = holder
+            with self._connections_lock:
+                self._connections.add(holder)
+        return holder.conn
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for holder in list(self._connections):
+                holder.conn.close()
+            self._connections.clear()
+        self._local = threading.local()
 
     def _create_tables_if_not_exist(self) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS videos (
-            id TEXT PRIMARY KEY,
-            channel TEXT NOT NULL,
-            duration TEXT,
-            title TEXT NOT NULL,
-            transcription TEXT,
-            summary TEXT,
-            watched INTEGER DEFAULT 0,
-            ditched INTEGER DEFAULT 0,
-            published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        conn.commit()
-        conn.close()
+        migrate(self._connection())
 
     def get_video(self, video_id: str) -> Optional[Dict[str, Any]]:
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            query = 'SELECT * FROM videos WHERE id = ?'
-            cursor.execute(query, (video_id,))  # Note the comma to make a single-element tuple
-            row = cursor.fetchone()
-            conn.close()
+            query = f'SELECT {LIST_COLUMNS} FROM videos v WHERE v.id = ?'
+            row = self._connection().execute(query, (video_id,)).fetchone()
             if row:
                 return dict(row)
             return None
@@ -46,9 +227,7 @@ class VideoDatabase:
 
     def update_video(self, video_id: str, **kwargs) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            valid_fields = {'channel', 'title', 'transcription', 'summary', 'watched', 'ditched'}
+            valid_fields = {'channel', 'title', 'watched', 'ditched'}
             updates = {k: v for k, v in kwargs.items() if k in valid_fields}
             if not updates:
                 return False
@@ -57,76 +236,692 @@ class VideoDatabase:
                 if key in updates and isinstance(updates[key], bool):
                     updates[key] = 1 if updates[key] else 0
 
-            set_clause = ", ".join([f"{field} = ?" for field in updates])
-            values = list(updates.values()) + [video_id]
+            # Fields are iterated in a fixed order so the same set of updates always
+            # produces the same SQL text and hits the statement cache.
+            fields = sorted(updates)
+            set_clause = ", ".join([f"{field} = ?" for field in fields])
+            values = [updates[field] for field in fields] + [video_id]
             query = f"UPDATE videos SET {set_clause} WHERE id = ?"
-            cursor.execute(query, values)
-            conn.commit()
-            conn.close()
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(query, values)
             return cursor.rowcount > 0
         except Exception as e:
             self.logger.error(f"Error updating video: {e}")
             return False
 
     def get_unwatched_videos(self) -> List[Dict[str, Any]]:
+        return self.get_unwatched_page()
+
+    def get_unwatched_page(self, after: Optional[Tuple[Any, str]] = None, limit: int = PAGE_SIZE,
+                           order: str = 'newest', max_length: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Unwatched videos, newest or shortest first, starting after the page_key of the last row of the
+        previous page. max_length leaves out videos longer than that many seconds; both it and sorting by
+        length leave out videos without a length."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            query = 'SELECT * FROM videos WHERE watched = 0 AND ditched = 0 ORDER BY published_at DESC LIMIT 200'
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            conn.close()
+            parameters = ([max_length] if max_length else []) + list(after or ()) + [limit]
+            query = unwatched_query(order, after is not None, bool(max_length))
+            rows = self._connection().execute(query, parameters).fetchall()
             return [dict(row) for row in rows]
         except Exception as e:
             self.logger.error(f"Error getting unwatched videos: {e}")
             return []
 
+    def search(self, text: str, limit: int = SEARCH_LIMIT, mark: Tuple[str, str] = ('*', '*')) -> List[Dict[str, Any]]:
+        """Best matches first across titles, channels, transcripts and summaries, each with a snippet
+        of the best matching column; mark surrounds the matched terms in the snippet."""
+        query = _match_query(text)
+        if not query:
+            return []
+        try:
+            rows = self._connection().execute(SEARCH_QUERY, (*mark, query, limit)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            self.logger.error(f"Error searching videos: {e}")
+            return []
+
     def mark_as_watched(self, video_id: str) -> bool:
         return self.update_video(video_id, watched=True)
 
     def mark_as_ditched(self, video_id: str) -> bool:
         return self.update_video(video_id, ditched=True)
 
-    def add_transcription(self, video_id: str, transcription: str) -> bool:
-        return self.update_video(video_id, transcription=transcription)
+    @staticmethod
+    def _write_text(conn: sqlite3.Connection, table: str, video_id: str, text: str) -> None:
+        row = conn.execute("SELECT rowid FROM videos WHERE id = ?", (video_id,)).fetchone()
+        rowid = row[0] if row else None
+        conn.execute(SEARCH_INDEX_DELETE_QUERY, (rowid,))
+        conn.execute(f"INSERT OR REPLACE INTO {table}(video_id, body) VALUES (?, ?)",
+                     (video_id, zlib.compress(text.encode('utf-8'))))
+        conn.execute(SEARCH_INDEX_INSERT_QUERY, (rowid,))
+
+    def _put_text(self, table: str, video_id: str, text: str) -> bool:
+        if not text:
+            return False
+        try:
+            conn = self._connection()
+            with conn:
+                self._write_text(conn, table, video_id, text)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error storing {table} for {video_id}: {e}")
+            return False
+
+    def _get_text(self, table: str, video_id: str) -> Optional[str]:
+        try:
+            row = self._connection().execute(f"SELECT body FROM {table} WHERE video_id = ?", (video_id,)).fetchone()
+            if row:
+                return zlib.decompress(row[0]).decode('utf-8')
+            return None
+        except Exception as e:
+            self.logger.error(f"Error loading {table} for {video_id}: {e}")
+            return None
+
+    def add_transcription(self, video_id: str, transcription: str,
+                          snippets: Optional[List[Dict[str, Any]]] = None) -> bool:
+        if not transcription:
+            return False
+        return self.add_transcripts([(video_id, transcription, snippets)])
+
+    def add_summary(self, video_id: str, summary: str, usage: Optional[Dict[str, int]] = None) -> bool:
+        if not self._put_text('summaries', video_id, summary):
+            return False
+        if usage:
+            return self._set_summary_usage(video_id, usage)
+        return True
+
+    def _set_summary_usage(self, video_id: str, usage: Dict[str, int]) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute("UPDATE summaries SET prompt_tokens = ?, output_tokens = ? WHERE video_id = ?",
+                             (usage.get('prompt_tokens', 0), usage.get('output_tokens', 0), video_id))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error storing summary usage for {video_id}: {e}")
+            return False
+
+    def get_transcription(self, video_id: str) -> Optional[str]:
+        return self._get_text('transcripts', video_id)
+
+    def get_summary(self, video_id: str) -> Optional[str]:
+        return self._get_text('summaries', video_id)
+
+    def add_transcripts(self, transcripts: List[Tuple[str, str, Optional[List[Dict[str, Any]]]]]) -> bool:
+        """Store (video_id, text, snippets) in one transaction and forget earlier failures to fetch them."""
+        try:
+            conn = self._connection()
+            with conn:
+                for video_id, text, snippets in transcripts:
+                    self._write_text(conn, 'transcripts', video_id, text)
+                    if snippets is not None:
+                        conn.execute("UPDATE transcripts SET snippets = ? WHERE video_id = ?",
+                                     (zlib.compress(json.dumps(snippets).encode('utf-8')), video_id))
+                conn.executemany("DELETE FROM transcript_failures WHERE video_id = ?",
+                                 [(video_id,) for video_id, _, _ in transcripts])
+            return True
+        except Exception as e:
+            self.logger.error(f"Error storing transcripts: {e}")
+            return False
+
+    def get_transcript_snippets(self, video_id: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            row = self._connection().execute("SELECT snippets FROM transcripts WHERE video_id = ?", (video_id,)).fetchone()
+            if row and row[0]:
+                return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+            return None
+        except Exception as e:
+            self.logger.error(f"Error loading transcript snippets for {video_id}: {e}")
+            return None
+
+    def get_transcribed_video_ids(self, video_ids: List[str]) -> set:
+        transcribed = set()
+        try:
+            conn = self._connection()
+            for i in range(0, len(video_ids), DEFAULT_CHUNK_SIZE):
+                chunk = video_ids[i:i + DEFAULT_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                transcribed.update(row[0] for row in conn.execute(
+                    f"SELECT video_id FROM transcripts WHERE video_id IN ({placeholders})", chunk))
+        except Exception as e:
+            self.logger.error(f"Error checking stored transcripts: {e}")
+        return transcribed
+
+    def get_transcript_failures(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        failures = {}
+        try:
+            conn = self._connection()
+            for i in range(0, len(video_ids), DEFAULT_CHUNK_SIZE):
+                chunk = video_ids[i:i + DEFAULT_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                for row in conn.execute(f"SELECT * FROM transcript_failures WHERE video_id IN ({placeholders})", chunk):
+                    failures[row['video_id']] = dict(row)
+        except Exception as e:
+            self.logger.error(f"Error getting transcript failures: {e}")
+        return failures
+
+    def record_transcript_failures(self, failures: List[Tuple[str, str, int, float]]) -> bool:
+        """Store (video_id, reason, attempts, retry_after) for transcripts that could not be fetched."""
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany('''
+                INSERT INTO transcript_failures(video_id, reason, attempts, retry_after) VALUES (?, ?, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    reason = excluded.reason,
+                    attempts = excluded.attempts,
+                    retry_after = excluded.retry_after,
+                    updated_at = CURRENT_TIMESTAMP
+                ''', failures)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error recording transcript failures: {e}")
+            return False
+
+    def enqueue_jobs(self, video_ids: List[str]) -> bool:
+        # Jobs that already exist keep their state, so finished or failed videos are not redone,
+        # unless they failed for want of a transcript that may be retried by now
+        try:
+            conn = self._connection()
+            now = time.time()
+            with conn:
+                conn.executemany('''
+                INSERT INTO jobs(video_id) VALUES (?)
+                ON CONFLICT(video_id) DO UPDATE SET state = 'pending', error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE jobs.state = 'failed' AND EXISTS(
+                    SELECT 1 FROM transcript_failures f WHERE f.video_id = excluded.video_id AND f.retry_after <= ?
+                )
+                ''', [(video_id, now) for video_id in video_ids])
+            return True
+        except Exception as e:
+            self.logger.error(f"Error enqueuing jobs: {e}")
+            return False
+
+    def get_pending_jobs(self, video_ids: Optional[List[str]] = None) -> List[str]:
+        try:
+            conn = self._connection()
+            if video_ids is None:
+                return [row[0] for row in conn.execute(PENDING_JOBS_QUERY)]
+            pending = []
+            for i in range(0, len(video_ids), DEFAULT_CHUNK_SIZE):
+                chunk = video_ids[i:i + DEFAULT_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                query = f"{PENDING_JOBS_QUERY} AND j.video_id IN ({placeholders})"
+                pending.extend(row[0] for row in conn.execute(query, chunk))
+            return pending
+        except Exception as e:
+            self.logger.error(f"Error getting pending jobs: {e}")
+            return []
+
+    def reset_running_jobs(self, owner: Optional[str] = None) -> int:
+        """Put running jobs back to pending, so they are retried: those owner claimed or, without an owner,
+        those whose claim was abandoned. Jobs another process is still running are left alone."""
+        try:
+            conn = self._connection()
+            with conn:
+                if owner is not None:
+                    cursor = conn.execute("UPDATE jobs SET state = 'pending' WHERE state = 'running' AND claimed_by = ?",
+                                          (owner,))
+                    return cursor.rowcount
+                owners = conn.execute(
+                    "SELECT DISTINCT claimed_by FROM jobs WHERE state = 'running' AND claimed_by IS NOT NULL")
+                gone = [row[0] for row in owners if _claim_abandoned(row[0])]
+                cursor = conn.execute(f'''
+                UPDATE jobs SET state = 'pending'
+                WHERE state = 'running' AND (claimed_by IS NULL OR heartbeat_at < ?
+                    OR claimed_by IN ({", ".join("?" * len(gone))}))
+                ''', (time.time() - STALE_CLAIM_SECONDS, *gone))
+            return cursor.rowcount
+        except Exception as e:
+            self.logger.error(f"Error resetting running jobs: {e}")
+            return 0
 
-    def add_summary(self, video_id: str, summary: str) -> bool:
-        return self.update_video(video_id, summary=summary)
+    def touch_jobs(self, owner: str) -> bool:
+        # The heartbeat that keeps owner's claims from looking abandoned
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE state = 'running' AND claimed_by = ?",
+                             (time.time(), owner))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error refreshing the job claims of {owner}: {e}")
+            return False
 
-    def add_video(self, video_id: str, channel: str, duration: str, title: str, published_at) -> bool:
+    def claim_job(self, video_id: str, owner: str) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute('''
+                UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP,
+                    claimed_by = ?, heartbeat_at = ?
+                WHERE video_id = ? AND state = 'pending'
+                    AND EXISTS(SELECT 1 FROM videos v WHERE v.id = jobs.video_id AND v.watched = 0 AND v.ditched = 0)
+                ''', (owner, time.time(), video_id))
+            return cursor.rowcount > 0
+        except Exception as e:
+            self.logger.error(f"Error claiming job {video_id}: {e}")
+            return False
+
+    def finish_job(self, video_id: str, state: str, error: Optional[str] = None) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute("UPDATE jobs SET state = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE video_id = ?",
+                             (state, error, video_id))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error finishing job {video_id}: {e}")
+            return False
+
+    def release_job(self, video_id: str) -> bool:
+        # Like when the Gemini quota is used up before the job's turn came
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(RELEASE_JOB_QUERY, (video_id,))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error releasing job {video_id}: {e}")
+            return False
+
+    def get_unsummarized_video_ids(self, limit: Optional[int] = None) -> List[str]:
+        """Unwatched videos without a summary, newest first."""
+        try:
+            rows = self._connection().execute('''
+            SELECT v.id FROM videos v
+            WHERE v.watched = 0 AND v.ditched = 0
+                AND NOT EXISTS(SELECT 1 FROM summaries s WHERE s.video_id = v.id)
+            ORDER BY v.published_at DESC, v.id DESC LIMIT ?
+            ''', (-1 if limit is None else limit,))
+            return [row[0] for row in rows]
+        except Exception as e:
+            self.logger.error(f"Error getting unsummarized videos: {e}")
+            return []
+
+    def claim_jobs(self, owner: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Claim pending jobs for owner, up to limit of them, newest videos first, in a single write."""
+        try:
+            conn = self._connection()
+            with conn:
+                rows = conn.execute('''
+                UPDATE jobs SET state = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP,
+                    claimed_by = ?, heartbeat_at = ?
+                WHERE video_id IN (
+                    SELECT j.video_id FROM jobs j JOIN videos v ON v.id = j.video_id
+                    WHERE j.state = 'pending' AND v.watched = 0 AND v.ditched = 0
+                    ORDER BY v.published_at DESC, v.id DESC LIMIT ?
+                )
+                RETURNING video_id, attempts
+                ''', (owner, time.time(), -1 if limit is None else limit)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            self.logger.error(f"Error claiming jobs: {e}")
+            return []
+
+    def save_job_results(self, summaries: List[Tuple[str, str, Dict[str, int]]],
+                         jobs: List[Tuple[str, str, Optional[str]]], released: Optional[List[str]] = None) -> bool:
+        """Store summaries with their usage and the (video_id, state, error) of finished jobs in one transaction,
+        and put the released jobs back to pending."""
+        try:
+            conn = self._connection()
+            with conn:
+                for video_id, summary, usage in summaries:
+                    self._write_text(conn, 'summaries', video_id, summary)
+                    conn.execute("UPDATE summaries SET prompt_tokens = ?, output_tokens = ? WHERE video_id = ?",
+                                 (usage.get('prompt_tokens', 0), usage.get('output_tokens', 0), video_id))
+                conn.executemany(
+                    "UPDATE jobs SET state = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE video_id = ?",
+                    [(state, error, video_id) for video_id, state, error in jobs]
+                )
+                conn.executemany(RELEASE_JOB_QUERY, [(video_id,) for video_id in released or ()])
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving job results: {e}")
+            return False
+
+    def count_jobs(self, state: str) -> int:
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"Error counting {state} jobs: {e}")
+            return 0
+
+    def get_job_attempts(self, video_id: str) -> int:
+        try:
+            row = self._connection().execute("SELECT attempts FROM jobs WHERE video_id = ?", (video_id,)).fetchone()
+            return row[0] if row else 0
+        except Exception as e:
+            self.logger.error(f"Error getting job attempts for {video_id}: {e}")
+            return 0
+
+    def get_setting(self, key: str) -> Optional[str]:
+        try:
+            row = self._connection().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            self.logger.error(f"Error reading setting {key}: {e}")
+            return None
+
+    def set_setting(self, key: str, value: Optional[str]) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                if value is None:
+                    conn.execute("DELETE FROM settings WHERE key = ?", (key,))
+                else:
+                    conn.execute("INSERT OR REPLACE INTO settings(key, value) VALUES (?, ?)", (key, value))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error storing setting {key}: {e}")
+            return False
+
+    def add_quota_usage(self, service: str, day: str, units: int, limit: int = 0) -> Tuple[bool, int]:
+        """Count units against the service's quota of the UTC day, unless that would go over limit (0 is none).
+
+        Returns whether they were counted and the usage of the day. Every process counts in the same
+        settings row, so cron runs and TUI sessions share one daily budget. Older days are dropped.
+        """
+        prefix = f"quota:{service}:"
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM settings WHERE key >= ? AND key < ?", (prefix, prefix + day))
+                row = conn.execute('''
+                INSERT INTO settings(key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = value + excluded.value
+                WHERE ? = 0 OR value + excluded.value <= ?
+                RETURNING value
+                ''', (prefix + day, units, limit, limit)).fetchone()
+            if row is not None:
+                return True, int(row[0])
+            return False, self.get_quota_usage(service, day)
+        except Exception as e:
+            # Better to spend some quota twice than to stop every API call
+            self.logger.error(f"Error counting {service} quota usage: {e}")
+            return True, 0
+
+    def get_quota_usage(self, service: str, day: str) -> int:
+        value = self.get_setting(f"quota:{service}:{day}")
+        return int(value) if value else 0
+
+    def add_to_playlist_outbox(self, video_id: str) -> bool:
+        # Adding a video that is already waiting, or gave up, queues it again from scratch
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute('''
+                INSERT INTO playlist_outbox(video_id) VALUES (?)
+                ON CONFLICT(video_id) DO UPDATE SET state = 'pending', attempts = 0, error = NULL, next_attempt_at = 0
+                ''', (video_id,))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error queueing {video_id} for the playlist: {e}")
+            return False
+
+    def get_due_playlist_items(self, now: float, limit: int = DEFAULT_CHUNK_SIZE) -> List[Dict[str, Any]]:
+        """Pending outbox entries whose next attempt is due, oldest first."""
+        try:
+            rows = self._connection().execute('''
+            SELECT video_id, attempts FROM playlist_outbox
+            WHERE state = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, rowid LIMIT ?
+            ''', (now, limit))
+            return [dict(row) for row in rows]
+        except Exception as e:
+            self.logger.error(f"Error reading the playlist outbox: {e}")
+            return []
+
+    def get_next_playlist_attempt(self) -> Optional[float]:
+        try:
+            row = self._connection().execute(
+                "SELECT MIN(next_attempt_at) FROM playlist_outbox WHERE state = 'pending'").fetchone()
+            return row[0]
+        except Exception as e:
+            self.logger.error(f"Error reading the playlist outbox: {e}")
+            return None
+
+    def remove_from_playlist_outbox(self, video_id: str) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM playlist_outbox WHERE video_id = ?", (video_id,))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error removing {video_id} from the playlist outbox: {e}")
+            return False
+
+    def retry_playlist_item(self, video_id: str, error: str, next_attempt_at: Optional[float]) -> bool:
+        """Record a failed attempt; without a next_attempt_at the entry is given up on."""
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute('''
+                UPDATE playlist_outbox SET attempts = attempts + 1, error = ?, state = ?, next_attempt_at = ?
+                WHERE video_id = ?
+                ''', (error, 'pending' if next_attempt_at is not None else 'failed', next_attempt_at or 0, video_id))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error rescheduling {video_id} in the playlist outbox: {e}")
+            return False
+
+    def postpone_playlist_items(self, next_attempt_at: float) -> bool:
+        # Used when the API quota is gone: nothing can be sent, but no attempt was spent either
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute('''
+                UPDATE playlist_outbox SET next_attempt_at = ? WHERE state = 'pending' AND next_attempt_at < ?
+                ''', (next_attempt_at, next_attempt_at))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error postponing the playlist outbox: {e}")
+            return False
+
+    def add_metrics(self, rows: List[Tuple[str, str, int, float, int, Dict[float, int]]]) -> bool:
+        """Add (name, kind, count, total, errors, {bucket upper bound: count}) to the stored totals."""
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany('''
+                INSERT INTO metrics(name, kind, count, total, errors) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET count = count + excluded.count, total = total + excluded.total,
+                    errors = errors + excluded.errors, updated_at = CURRENT_TIMESTAMP
+                ''', [row[:5] for row in rows])
+                conn.executemany('''
+                INSERT INTO metric_buckets(name, le, count) VALUES (?, ?, ?)
+                ON CONFLICT(name, le) DO UPDATE SET count = count + excluded.count
+                ''', [(row[0], le, count) for row in rows for le, count in row[5].items()])
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving metrics: {e}")
+            return False
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            conn = self._connection()
+            stored = {row['name']: dict(row, buckets={})
+                      for row in conn.execute("SELECT name, kind, count, total, errors FROM metrics")}
+            for name, le, count in conn.execute("SELECT name, le, count FROM metric_buckets"):
+                stored[name]['buckets'][le] = count
+            return stored
+        except Exception as e:
+            self.logger.error(f"Error reading metrics: {e}")
+            return {}
+
+    def get_cached_summary(self, key: str) -> Optional[str]:
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT body FROM summary_cache WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            with conn:
+                conn.execute("UPDATE summary_cache SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            return zlib.decompress(row[0]).decode('utf-8')
+        except Exception as e:
+            self.logger.error(f"Error reading summary cache: {e}")
+            return None
+
+    def put_cached_summary(self, key: str, summary: str, max_bytes: int) -> bool:
+        """Store a cache entry, then evict least recently used entries until the cache fits in max_bytes."""
+        try:
+            body = zlib.compress(summary.encode('utf-8'))
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO summary_cache(key, body, size, last_used_at) VALUES (?, ?, ?, ?)",
+                             (key, body, len(body), time.time()))
+                excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM summary_cache").fetchone()[0] - max_bytes
+                if excess > 0:
+                    evicted = []
+                    for row in conn.execute("SELECT key, size FROM summary_cache WHERE key != ? ORDER BY last_used_at", (key,)):
+                        if excess <= 0:
+                            break
+                        evicted.append((row['key'],))
+                        excess -= row['size']
+                    conn.executemany("DELETE FROM summary_cache WHERE key = ?", evicted)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error writing summary cache: {e}")
+            return False
+
+    def add_video(self, video_id: str, channel: str, duration: int, title: str, published_at) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            query = 'INSERT OR REPLACE INTO videos(id, channel, duration, title, published_at) VALUES (?, ?, ?, ?, ?)'
             parameters = (video_id, channel, duration, title, published_at)
-            cursor.execute(query, parameters)
-            conn.commit()
-            conn.close()
+            conn = self._connection()
+            with conn:
+                conn.execute(UPSERT_VIDEO_QUERY, parameters)
             return True
         except Exception as e:
             self.logger.error(f"Error adding video: {e}")
             return False
 
-    def add_videos(self, videos: List[Dict[str, Any]]) -> bool:
+    def add_videos(self, videos: List[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Tuple[int, int]]:
+        """Upsert a feed batch in one transaction, returns (inserted, updated) or None on error.
+
+        Existing rows keep their watched and ditched values;
+        rows whose metadata did not change are not rewritten and count as neither.
+        """
         if not videos:
+            return 0, 0
+        try:
+            conn = self._connection()
+            inserted = 0
+            changed = 0
+            with conn:
+                for i in range(0, len(videos), chunk_size):
+                    chunk = videos[i:i + chunk_size]
+                    ids = [video['id'] for video in chunk]
+                    placeholders = ", ".join("?" * len(ids))
+                    existing = {row[0] for row in conn.execute(
+                        f"SELECT id FROM videos WHERE id IN ({placeholders})", ids)}
+                    inserted += len(set(ids) - existing)
+                    # rowcount leaves out the rows the FTS triggers write, total_changes would not
+                    changed += conn.executemany(UPSERT_VIDEO_QUERY, [
+                        (video['id'], video['channel'], video['duration'], video['title'], video['published_at'])
+                        for video in chunk
+                    ]).rowcount
+            updated = changed - inserted
+            self.logger.info(f"Ingested {len(videos)} videos: {inserted} inserted, {updated} updated")
+            return inserted, updated
+        except Exception as e:
+            self.logger.error(f"Error adding videos batch: {e}")
+            return None
+
+    def get_existing_video_ids(self, video_ids: List[str]) -> set:
+        existing = set()
+        try:
+            conn = self._connection()
+            for i in range(0, len(video_ids), DEFAULT_CHUNK_SIZE):
+                chunk = video_ids[i:i + DEFAULT_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                existing.update(row[0] for row in conn.execute(
+                    f"SELECT id FROM videos WHERE id IN ({placeholders})", chunk))
+        except Exception as e:
+            self.logger.error(f"Error checking existing videos: {e}")
+        return existing
+
+    def get_channels(self, channel_ids: List[str], max_age_seconds: int) -> Dict[str, Dict[str, Any]]:
+        """Cached channel metadata fetched less than max_age_seconds ago, keyed by channel id."""
+        channels = {}
+        try:
+            conn = self._connection()
+            for i in range(0, len(channel_ids), DEFAULT_CHUNK_SIZE):
+                chunk = channel_ids[i:i + DEFAULT_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                query = f'''
+                SELECT id, title, uploads_playlist_id FROM channels
+                WHERE id IN ({placeholders})
+                    AND uploads_playlist_id IS NOT NULL
+                    AND fetched_at >= datetime('now', ?)
+                '''
+                for row in conn.execute(query, chunk + [f"-{max_age_seconds} seconds"]):
+                    channels[row['id']] = dict(row)
+        except Exception as e:
+            self.logger.error(f"Error getting channels: {e}")
+        return channels
+
+    def add_channels(self, channels: List[Dict[str, Any]]) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany('''
+                INSERT INTO channels(id, title, uploads_playlist_id, fetched_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(id) DO UPDATE SET
+                    title = excluded.title,
+                    uploads_playlist_id = excluded.uploads_playlist_id,
+                    fetched_at = excluded.fetched_at
+                ''', [(channel['id'], channel['title'], channel['uploads_playlist_id']) for channel in channels])
             return True
+        except Exception as e:
+            self.logger.error(f"Error adding channels: {e}")
+            return False
+
+    def update_channel_titles(self, titles: Dict[str, str]) -> bool:
+        # Keeps titles current without touching fetched_at, so the TTL still applies
         try:
-            for video in videos:
-                self.add_video(video['id'], video['channel'], video['duration'], video['title'], video['published_at'])
+            conn = self._connection()
+            with conn:
+                conn.executemany('''
+                INSERT INTO channels(id, title) VALUES (?, ?)
+                ON CONFLICT(id) DO UPDATE SET title = excluded.title WHERE title IS NOT excluded.title
+                ''', list(titles.items()))
             return True
         except Exception as e:
-            self.logger.error(f"Error adding videos batch: {e}")
+            self.logger.error(f"Error updating channel titles: {e}")
+            return False
+
+    def get_sync_states(self, channel_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        states = {}
+        try:
+            conn = self._connection()
+            for i in range(0, len(channel_ids), DEFAULT_CHUNK_SIZE):
+                chunk = channel_ids[i:i + DEFAULT_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                query = f"SELECT channel_id, last_video_id, last_published_at, etag FROM sync_state WHERE channel_id IN ({placeholders})"
+                for row in conn.execute(query, chunk):
+                    states[row['channel_id']] = dict(row)
+        except Exception as e:
+            self.logger.error(f"Error getting sync states: {e}")
+        return states
+
+    def save_sync_states(self, states: List[Dict[str, Any]]) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany('''
+                INSERT OR REPLACE INTO sync_state(channel_id, last_video_id, last_published_at, etag, synced_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', [(state['channel_id'], state['last_video_id'], state['last_published_at'], state['etag'])
+                      for state in states])
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving sync states: {e}")
             return False
 
     def get_latest_video_date_for_channel(self, channel_name: str) -> Optional[str]:
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            query = 'SELECT MAX(published_at) FROM videos WHERE channel = ?'
-            cursor.execute(query, (channel_name,))
-            result = cursor.fetchone()
-            conn.close()
+            result = self._connection().execute(LATEST_VIDEO_DATE_QUERY, (channel_name,)).fetchone()
             if result and result[0]:
                 return result[0]
             return None
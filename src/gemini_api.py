@@ -1,87 +1,284 @@
-import google.generativeai as genai
 import logging
-from google.api_core.exceptions import ResourceExhausted
-from typing import Tuple
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from src import metrics
+from src.chunked_summary import CHARS_PER_TOKEN, join_partials, split_into_chunks, summarize_chunked, summarize_chunks
+from src.database import VideoDatabase
+from src.rate_limit import QuotaExhausted, RateLimiter, call_with_backoff, get_limiter
+from src.summary_cache import SummaryCache
+from src.transcripts import TranscriptUnavailable, fetch_snippets, join_snippets
 from src.utils import get_conf
-from src.youtube_auth import get_authenticated_service
-from youtube_transcript_api import YouTubeTranscriptApi
 
 
 logger = logging.getLogger('faria_logger')
 
-def setup_gemini_api():
-    with open(get_conf('Paths', 'gemini_api_key'), 'r') as file:
-        key = file.read()
-        genai.configure(api_key=key)
-        return genai.GenerativeModel('gemini-1.5-pro')
+# The ids name the prompts in logs and metrics. The summary cache keys on the template text too,
+# so an edited template, built in or from prompts_dir, never gets the outputs of the old one
+PROMPTS = {
+    'summary-v1': """
+            What follows is the transcript of a YouTube video, I want you to summarize it.
+            Based on this summary I will decide if I want to watch the video or not.
+            The summary should a least have a title, the list of tags, bullet points and a
+            brief conclusion where you add the "watch this video if" part explaining who and why should watch the video.
+            Prefer short sentences over longer paragraphs, space out the text and use bullet points if possible.
+
+            Transcript: {text}
+            """,
+    'extended-v1': """
+            What follows is the transcript of a YouTube video, I want you to explain it in more detail.
+            I do not want to read the whole transcript, but I want to know what the video is about
+            and get the most out of it with a 10 minute read at most.
 
+            Transcript: {text}
+            """,
+    'chunk-v1': """
+            What follows is one part of the transcript of a long YouTube video.
+            Summarize this part only, keeping every topic, claim, name and number that matters,
+            in the order they come up. Do not add an introduction or a conclusion.
+
+            Transcript part: {text}
+            """,
+    'summary-reduce-v1': """
+            What follows are summaries of consecutive parts of the transcript of a YouTube video, I want you to summarize the whole video.
+            Based on this summary I will decide if I want to watch the video or not.
+            The summary should a least have a title, the list of tags, bullet points and a
+            brief conclusion where you add the "watch this video if" part explaining who and why should watch the video.
+            Prefer short sentences over longer paragraphs, space out the text and use bullet points if possible.
+
+            {text}
+            """,
+    'extended-reduce-v1': """
+            What follows are summaries of consecutive parts of the transcript of a YouTube video, I want you to explain the video in more detail.
+            I do not want to read the whole transcript, but I want to know what the video is about
+            and get the most out of it with a 10 minute read at most.
 
-def get_video_details(video_id: str) -> Tuple[str, str]:
-    request = get_authenticated_service().videos().list(part="snippet", id=video_id)
-    response = request.execute()
+            {text}
+            """,
+}
+SUMMARY_PROMPT = 'summary-v1'
+EXTENDED_PROMPT = 'extended-v1'
+CHUNK_PROMPT = 'chunk-v1'
+REDUCE_PROMPTS = {SUMMARY_PROMPT: 'summary-reduce-v1', EXTENDED_PROMPT: 'extended-reduce-v1'}
 
-    if not response['items']:
-        raise ValueError(f"No video found with ID: {video_id}")
+_summary_cache: Optional[SummaryCache] = None
 
-    video_info = response['items'][0]['snippet']
-    title = video_info['title']
-    description = video_info['description']
 
-    return title, description
+def get_summary_cache() -> SummaryCache:
+    global _summary_cache
+    if _summary_cache is None:
+        max_bytes = int(get_conf('Cache', 'summary_cache_mb')) * 1024 * 1024
+        _summary_cache = SummaryCache(VideoDatabase(), max_bytes)
+    return _summary_cache
 
 
-def get_youtube_transcript(video_id):
+def _usage(response) -> Dict[str, int]:
+    metadata = getattr(response, 'usage_metadata', None)
+    return {
+        'prompt_tokens': getattr(metadata, 'prompt_token_count', 0) or 0,
+        'output_tokens': getattr(metadata, 'candidates_token_count', 0) or 0,
+    }
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    # Only called once a request failed, when the client library is loaded anyway
+    from google.api_core.exceptions import ResourceExhausted
+    return isinstance(error, ResourceExhausted)
+
+
+class Summarizer:
+    """Gemini client configured once: API key, model and prompt templates.
+
+    generate() returns the model output together with its token usage;
+    outputs served from the summary cache report zero usage.
+    """
+
+    def __init__(self, api_key: str, model_name: str, prompts: Dict[str, str], cache: SummaryCache):
+        # Importing the Gemini client takes about a second, so it waits for the first summary
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.prompts = prompts
+        self._model = genai.GenerativeModel(model_name)
+        self._cache = cache
+
+    def _prompt(self, text: str, prompt_id: str) -> str:
+        if not text:
+            raise ValueError("Nothing to summarize")
+        return self.prompts[prompt_id].format(text=text)
+
+    def _cached(self, text: str, prompt_id: str) -> Optional[str]:
+        cached = self._cache.get(text, prompt_id, self.prompts[prompt_id], self.model_name)
+        metrics.count('summary_cache', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            logger.info(f"{prompt_id} served from cache ({self._cache.stats()})")
+        return cached
+
+    def _store(self, text: str, prompt_id: str, response) -> Tuple[str, Dict[str, int]]:
+        usage = _usage(response)
+        metrics.count('gemini_tokens', usage['prompt_tokens'], kind='prompt', model=self.model_name)
+        metrics.count('gemini_tokens', usage['output_tokens'], kind='output', model=self.model_name)
+        logger.info(f"{prompt_id} on {self.model_name}: {usage['prompt_tokens']} prompt tokens, "
+                    f"{usage['output_tokens']} output tokens")
+        self._cache.put(text, prompt_id, self.prompts[prompt_id], self.model_name, response.text)
+        return response.text, usage
+
+    def _request(self, call, prompt: str):
+        limiter = get_limiter('gemini')
+        try:
+            return call_with_backoff(limiter, call, is_rate_limited=_is_rate_limited,
+                                     tokens=len(prompt) / CHARS_PER_TOKEN)
+        except Exception as e:
+            if not _is_rate_limited(e):
+                raise
+            # Still rate limited after every retry: the daily quota is gone, not just the minute's
+            limiter.exhaust()
+            raise QuotaExhausted(f"gemini: quota exceeded: {e}", RateLimiter.seconds_until_reset()) from e
+
+    def generate(self, text: str, prompt_id: str) -> Tuple[str, Dict[str, int]]:
+        prompt = self._prompt(text, prompt_id)
+        cached = self._cached(text, prompt_id)
+        if cached is not None:
+            return cached, _usage(None)
+
+        def request():
+            with metrics.timer('gemini_request', prompt=prompt_id):
+                return self._model.generate_content(prompt)
+
+        response = self._request(request, prompt)
+        return self._store(text, prompt_id, response)
+
+    def stream(self, text: str, prompt_id: str) -> Iterator[str]:
+        """Yield the output as the model produces it; it is cached only if the stream is read to the end."""
+        prompt = self._prompt(text, prompt_id)
+        cached = self._cached(text, prompt_id)
+        if cached is not None:
+            yield cached
+            return
+        start = time.perf_counter()
+        response = self._request(lambda: self._model.generate_content(prompt, stream=True), prompt)
+        first_token = None
+        for chunk in response:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+                logger.info(f"{prompt_id} first token after {first_token:.2f}s")
+                metrics.observe('gemini_first_token', first_token, prompt=prompt_id)
+            yield chunk.text
+        logger.info(f"{prompt_id} streamed in {time.perf_counter() - start:.2f}s")
+        metrics.observe('gemini_stream', time.perf_counter() - start, prompt=prompt_id)
+        self._store(text, prompt_id, response)
+
+
+def _load_prompts() -> Dict[str, str]:
+    # A {prompt_id}.txt file in the prompts directory replaces the built-in template
+    prompts = dict(PROMPTS)
+    prompts_dir = get_conf('Paths', 'prompts_dir')
+    for prompt_id in PROMPTS:
+        path = os.path.join(prompts_dir, f"{prompt_id}.txt")
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                prompts[prompt_id] = file.read()
+    return prompts
+
+
+_summarizer: Optional[Summarizer] = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer() -> Summarizer:
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            with open(get_conf('Paths', 'gemini_api_key'), 'r') as file:
+                key = file.read().strip()
+            _summarizer = Summarizer(key, get_conf('Gemini', 'model'), _load_prompts(), get_summary_cache())
+        return _summarizer
+
+
+def get_youtube_transcript_snippets(video_id) -> Optional[List[Dict[str, Any]]]:
     try:
-        transcript = YouTubeTranscriptApi().fetch(video_id, ['it', 'en'])
-        text = " ".join([item.text for item in transcript.snippets])
-        return text
-    except Exception as e:
+        return fetch_snippets(video_id)
+    except TranscriptUnavailable as e:
         logger.error(f"Error getting transcript: {e}")
         return None
 
 
-def summarize_text(text):
+def get_youtube_transcript(video_id):
+    snippets = get_youtube_transcript_snippets(video_id)
+    if snippets is None:
+        return None
+    return join_snippets(snippets)
+
+
+def _summarize(text, prompt_id, snippets: Optional[List[str]] = None, usage: Optional[Dict[str, int]] = None):
+    # snippets are the texts of the transcript's snippets, see transcripts.snippet_texts; without them
+    # the chunks break between words. Chunk outputs go through the summary cache, so re-running a prompt reuses them.
+    if not text:
+        raise ValueError("Nothing to summarize")
+    summarizer = get_summarizer()
+    usage_lock = threading.Lock()
+
+    def generate(chunk: str, chunk_prompt_id: str) -> str:
+        output, call_usage = summarizer.generate(chunk, chunk_prompt_id)
+        if usage is not None:
+            with usage_lock:
+                for key, tokens in call_usage.items():
+                    usage[key] = usage.get(key, 0) + tokens
+        return output
+
+    token_budget = int(get_conf('Summary', 'chunk_token_budget'))
+    if len(text) <= token_budget * CHARS_PER_TOKEN:
+        return generate(text, prompt_id)
+    return summarize_chunked(
+        snippets or text.split(),
+        generate,
+        prompt_id,
+        CHUNK_PROMPT,
+        REDUCE_PROMPTS[prompt_id],
+        token_budget=token_budget,
+        workers=int(get_conf('Summary', 'chunk_workers')),
+    )
+
+
+def stream_summary(text, prompt_id: str, snippets: Optional[List[str]] = None) -> Iterator[str]:
+    """Stream a summary. For long transcripts the chunk summaries are computed first and only the reduce step streams."""
+    summarizer = get_summarizer()
+    token_budget = int(get_conf('Summary', 'chunk_token_budget'))
+    if len(text) <= token_budget * CHARS_PER_TOKEN:
+        yield from summarizer.stream(text, prompt_id)
+        return
+    partials = summarize_chunks(
+        split_into_chunks(snippets or text.split(), token_budget),
+        lambda chunk, chunk_prompt_id: summarizer.generate(chunk, chunk_prompt_id)[0],
+        CHUNK_PROMPT,
+        workers=int(get_conf('Summary', 'chunk_workers')),
+    )
+    yield from summarizer.stream(join_partials(partials), REDUCE_PROMPTS[prompt_id])
+
+
+def summarize_text(text, usage: Optional[Dict[str, int]] = None, snippets: Optional[List[str]] = None):
     logger.info("summarize_text")
     try:
-        setup_gemini_api()
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        prompt = f"""
-            What follows is the transcript of a YouTube video, I want you to summarize it.
-            Based on this summary I will decide if I want to watch the video or not.
-            The summary should a least have a title, the list of tags, bullet points and a 
-            brief conclusion where you add the "watch this video if" part explaining who and why should watch the video.
-            Prefer short sentences over longer paragraphs, space out the text and use bullet points if possible.
-
-            Transcript: {text}
-            """
-        response = model.generate_content(prompt)
+        summary = _summarize(text, SUMMARY_PROMPT, snippets, usage)
         logger.info("summarize_text finished")
-        return response.text
-    except ResourceExhausted as e:
-        logger.error(f"Quota exceeded")
-        return None
+        return summary
+    except QuotaExhausted:
+        # Not a failure of this transcript: the caller keeps the work for when the quota resets
+        raise
     except Exception as e:
         logger.error(f"Error in summarize_text: {e}")
         return None
 
-def extended_summarize_text(text):
+def extended_summarize_text(text, usage: Optional[Dict[str, int]] = None, snippets: Optional[List[str]] = None):
     logger.info("extended_summarize_text")
     try:
-        setup_gemini_api()
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        prompt = f"""
-            What follows is the transcript of a YouTube video, I want you to explain it in more detail.
-            I do not want to read the whole transcript, but I want to know what the video is about 
-            and get the most out of it with a 10 minute read at most.
-
-            Transcript: {text}
-            """
-        response = model.generate_content(prompt)
+        summary = _summarize(text, EXTENDED_PROMPT, snippets, usage)
         logger.info("extended_summarize_text finished")
-        return response.text
-    except ResourceExhausted as e:
-        logger.error(f"Quota exceeded")
-        return None
+        return summary
+    except QuotaExhausted:
+        raise
     except Exception as e:
         logger.error(f"Error in extended_summarize_text: {e}")
         return None
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from src.database import CLAIM_HEARTBEAT_SECONDS, VideoDatabase, new_claim_owner
+from src.rate_limit import QuotaExhausted
+from src.transcripts import snippet_texts
+
+
+logger = logging.getLogger('faria_logger')
+
+
+class SummaryWorkerPool:
+    """Background threads that fetch transcripts and summarize videos from the jobs table.
+
+    Job state is persisted, so jobs a previous process abandoned while running are picked
+    up again on start(), while those another process is still running are left to it.
+    Among pending jobs, workers always take the one with the lowest priority(video_id),
+    which lets the TUI favour the rows nearest the cursor.
+    fetch_transcript(video_id) returns the stored transcript, or fetches and stores it.
+    summarize(transcript, usage, snippets) fills usage with the tokens it spent, which are
+    stored with the summary; snippets are the texts long transcripts are chunked between.
+    When summarize raises QuotaExhausted the job goes back to pending without using up an
+    attempt, and every worker waits until the quota resets.
+    """
+
+    def __init__(self, db: VideoDatabase,
+                 fetch_transcript: Callable[[str], Optional[str]],
+                 summarize: Callable[[str, Dict[str, int], Optional[List[str]]], Optional[str]],
+                 workers: int = 2,
+                 priority: Optional[Callable[[str], int]] = None,
+                 on_done: Optional[Callable[[str], None]] = None,
+                 max_attempts: int = 3,
+                 retry_delay: float = 60):
+        self._db = db
+        self._fetch_transcript = fetch_transcript
+        self._summarize = summarize
+        self._workers = workers
+        self._priority = priority or (lambda video_id: 0)
+        self._on_done = on_done
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._pending: Set[str] = set()
+        # Jobs waiting out retry_delay after a failed attempt, by the monotonic time they are due
+        self._retry_at: Dict[str, float] = {}
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self._stopping = threading.Event()
+        self._owner = new_claim_owner()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        self._db.reset_running_jobs()
+        with self._condition:
+            self._pending.update(self._db.get_pending_jobs())
+        targets = [(self._run, f"summary-worker-{i}") for i in range(max(1, self._workers))]
+        for target, name in targets + [(self._heartbeat, "summary-heartbeat")]:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Summary workers started: {len(targets)} threads, {len(self._pending)} pending jobs")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def submit(self, video_ids: Iterable[str]) -> None:
+        video_ids = list(video_ids)
+        if not video_ids:
+            return
+        self._db.enqueue_jobs(video_ids)
+        with self._condition:
+            self._pending.update(video_id for video_id in self._db.get_pending_jobs(video_ids)
+                                 if video_id not in self._retry_at)
+            self._condition.notify_all()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def _next_job(self) -> Optional[str]:
+        with self._condition:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                for video_id in [video_id for video_id, due in self._retry_at.items() if due <= now]:
+                    del self._retry_at[video_id]
+                    self._pending.add(video_id)
+                if self._paused_until > now:
+                    self._condition.wait(self._paused_until - now)
+                elif self._pending:
+                    break
+                else:
+                    self._condition.wait(min(self._retry_at.values()) - now if self._retry_at else None)
+            if self._stopping.is_set():
+                return None
+            video_id = min(self._pending, key=self._priority)
+            self._pending.discard(video_id)
+            return video_id
+
+    def _run(self) -> None:
+        while True:
+            video_id = self._next_job()
+            if video_id is None:
+                return
+            if not self._db.claim_job(video_id, self._owner):
+                continue
+            try:
+                self._process(video_id)
+            except QuotaExhausted as e:
+                logger.warning(f"Summary workers paused for {e.retry_after / 3600:.1f}h: {e}")
+                self._db.release_job(video_id)
+                with self._condition:
+                    self._paused_until = time.monotonic() + e.retry_after
+                    self._pending.add(video_id)
+            except Exception as e:
+                logger.exception(f"Summary job for {video_id} crashed: {e}")
+                self._retry(video_id, str(e))
+
+    def _heartbeat(self) -> None:
+        # Keeps the claims of the jobs the workers are running from looking abandoned to other processes
+        while not self._stopping.wait(CLAIM_HEARTBEAT_SECONDS):
+            self._db.touch_jobs(self._owner)
+
+    def _process(self, video_id: str) -> None:
+        transcript = self._fetch_transcript(video_id)
+        if not transcript:
+            self._db.finish_job(video_id, 'failed', 'No transcript available')
+            return
+
+        usage: Dict[str, int] = {}
+        summary = self._summarize(transcript, usage, snippet_texts(self._db, video_id))
+        if not summary:
+            self._retry(video_id, 'Summarization returned nothing')
+            return
+        self._db.add_summary(video_id, summary, usage)
+        self._db.finish_job(video_id, 'done')
+        if self._on_done:
+            self._on_done(video_id)
+
+    def _retry(self, video_id: str, error: str) -> None:
+        if self._db.get_job_attempts(video_id) >= self._max_attempts:
+            self._db.finish_job(video_id, 'failed', error)
+            return
+        self._db.finish_job(video_id, 'pending', error)
+        # The worker moves on; the job is picked up again once retry_delay has passed
+        with self._condition:
+            self._retry_at[video_id] = time.monotonic() + self._retry_delay
+            self._condition.notify()
@@ -0,0 +1,268 @@
+import bisect
+import contextlib
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.utils import get_conf, project_root
+
+
+logger = logging.getLogger('faria_logger')
+
+# Upper bounds in seconds of the latency histogram buckets, the last one takes everything slower
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+PROMETHEUS_PREFIX = 'faria_'
+# Shared by every timer() call while metrics are off, so a disabled timer allocates nothing
+_NO_TIMER = contextlib.nullcontext()
+
+_enabled = False
+_lock = threading.Lock()
+# Everything recorded since the process started, and the part of it already saved by flush()
+_stats: Dict[str, 'Stat'] = {}
+_flushed: Dict[str, 'Stat'] = {}
+
+
+class Stat:
+    """A timer (count, total seconds, errors and a latency histogram) or a counter (count and total)."""
+
+    __slots__ = ('kind', 'count', 'total', 'errors', 'buckets')
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.buckets = [0] * len(BUCKETS)
+
+    def copy(self) -> 'Stat':
+        stat = Stat(self.kind)
+        stat.count, stat.total, stat.errors, stat.buckets = self.count, self.total, self.errors, list(self.buckets)
+        return stat
+
+    def minus(self, other: Optional['Stat']) -> 'Stat':
+        stat = self.copy()
+        if other is not None:
+            stat.count -= other.count
+            stat.total -= other.total
+            stat.errors -= other.errors
+            stat.buckets = [a - b for a, b in zip(self.buckets, other.buckets)]
+        return stat
+
+    def quantile(self, q: float) -> float:
+        """Estimated from the histogram, interpolating inside the bucket the quantile falls in."""
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                if BUCKETS[i] == float('inf'):
+                    return lower
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / count
+            seen += count
+        return 0.0
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def setup() -> None:
+    """Turn metrics on or off from [Metrics] enabled in config.ini."""
+    enable(get_conf('Metrics', 'enabled').strip().lower() in ('1', 'true', 'yes', 'on'))
+
+
+def key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{label}="{value}"' for label, value in sorted(labels.items())) + '}'
+
+
+def _record(metric: str, kind: str, value: float, ok: bool = True) -> None:
+    with _lock:
+        stat = _stats.get(metric)
+        if stat is None:
+            stat = _stats[metric] = Stat(kind)
+        if kind == 'timer':
+            stat.count += 1
+            stat.total += value
+            stat.errors += not ok
+            stat.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        else:
+            stat.count += 1
+            stat.total += value
+
+
+def observe(name: str, seconds: float, ok: bool = True, **labels) -> None:
+    if _enabled:
+        _record(key(name, labels), 'timer', seconds, ok)
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    if _enabled:
+        _record(key(name, labels), 'counter', value)
+
+
+class _Timer:
+    __slots__ = ('metric', 'start')
+
+    def __init__(self, metric: str):
+        self.metric = metric
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _record(self.metric, 'timer', time.perf_counter() - self.start, exc_type is None)
+
+
+def timer(name: str, **labels):
+    """Context manager timing its block; an exception leaving the block counts as an error."""
+    if not _enabled:
+        return _NO_TIMER
+    return _Timer(key(name, labels))
+
+
+def _timed(function: Callable, name: str) -> Callable:
+    metric = key(name, {'method': function.__name__})
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        with _Timer(metric):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def instrument(name: str, exclude: Tuple[str, ...] = ()) -> Callable[[type], type]:
+    """Class decorator timing every public method but the excluded ones as name{method="..."}."""
+    def decorate(cls: type) -> type:
+        for attribute, value in list(vars(cls).items()):
+            if not attribute.startswith('_') and attribute not in exclude and inspect.isfunction(value):
+                setattr(cls, attribute, _timed(value, name))
+        return cls
+    return decorate
+
+
+def snapshot() -> Dict[str, Stat]:
+    """What this process has recorded so far."""
+    with _lock:
+        return {metric: stat.copy() for metric, stat in _stats.items()}
+
+
+def pending() -> bool:
+    with _lock:
+        return any(stat.count != getattr(_flushed.get(metric), 'count', 0) for metric, stat in _stats.items())
+
+
+def flush(db) -> bool:
+    """Add what was recorded since the last flush to the totals in db, then write the Prometheus textfile."""
+    with _lock:
+        current = {metric: stat.copy() for metric, stat in _stats.items()}
+        previous = dict(_flushed)
+        _flushed.update(current)
+    deltas = [(metric, stat.minus(previous.get(metric))) for metric, stat in current.items()]
+    deltas = [(metric, delta) for metric, delta in deltas if delta.count]
+    if not deltas:
+        return True
+    rows = [(metric, delta.kind, delta.count, delta.total, delta.errors,
+             {BUCKETS[i]: n for i, n in enumerate(delta.buckets) if n} if delta.kind == 'timer' else {})
+            for metric, delta in deltas]
+    if not db.add_metrics(rows):
+        # Saved with the next flush instead
+        with _lock:
+            for metric, _ in deltas:
+                if metric in previous:
+                    _flushed[metric] = previous[metric]
+                else:
+                    _flushed.pop(metric, None)
+        return False
+    textfile = get_conf('Metrics', 'textfile').strip()
+    if textfile:
+        write_textfile(os.path.join(project_root(), textfile), load(db))
+    return True
+
+
+def load(db) -> Dict[str, Stat]:
+    """The totals of every run, as saved by flush()."""
+    stats = {}
+    for metric, row in db.get_metrics().items():
+        stat = stats[metric] = Stat(row['kind'])
+        stat.count, stat.total, stat.errors = row['count'], row['total'], row['errors']
+        for le, n in row['buckets'].items():
+            stat.buckets[BUCKETS.index(le)] = n
+    return stats
+
+
+def _split(metric: str) -> Tuple[str, str]:
+    name, _, labels = metric.partition('{')
+    return name, labels.rstrip('}')
+
+
+def report(stats: Dict[str, Stat]) -> str:
+    lines = [f"{'timer':<48}{'count':>8}{'errors':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'total':>10}"]
+    for metric, stat in sorted(stats.items()):
+        if stat.kind != 'timer':
+            continue
+        mean = stat.total / stat.count if stat.count else 0.0
+        lines.append(f"{metric:<48}{stat.count:>8}{stat.errors:>8}{_seconds(mean):>10}{_seconds(stat.quantile(0.5)):>10}"
+                     f"{_seconds(stat.quantile(0.95)):>10}{_seconds(stat.quantile(0.99)):>10}{stat.total:>9.1f}s")
+    counters = [(metric, stat) for metric, stat in sorted(stats.items()) if stat.kind != 'timer']
+    if counters:
+        lines.append("")
+        lines.append(f"{'counter':<48}{'value':>12}")
+        lines.extend(f"{metric:<48}{stat.total:>12.0f}" for metric, stat in counters)
+    return "\n".join(lines)
+
+
+def _seconds(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def prometheus(stats: Dict[str, Stat]) -> str:
+    """stats in the Prometheus text exposition format, every metric family in one block."""
+    families: Dict[str, List[str]] = {}
+
+    def add(family: str, kind: str, line: str) -> None:
+        families.setdefault(family, [f"# TYPE {family} {kind}"]).append(line)
+
+    for metric, stat in sorted(stats.items()):
+        name, labels = _split(metric)
+        suffix = f"{{{labels}}}" if labels else ""
+        if stat.kind == 'timer':
+            histogram = f"{PROMETHEUS_PREFIX}{name}_seconds"
+            cumulative = 0
+            for le, n in zip(BUCKETS, stat.buckets):
+                cumulative += n
+                bound = '+Inf' if le == float('inf') else repr(le)
+                add(histogram, 'histogram', f'{histogram}_bucket{{{labels + "," if labels else ""}le="{bound}"}} {cumulative}')
+            add(histogram, 'histogram', f"{histogram}_sum{suffix} {stat.total}")
+            add(histogram, 'histogram', f"{histogram}_count{suffix} {stat.count}")
+            errors = f"{PROMETHEUS_PREFIX}{name}_errors_total"
+            add(errors, 'counter', f"{errors}{suffix} {stat.errors}")
+        else:
+            counter = f"{PROMETHEUS_PREFIX}{name}_total"
+            add(counter, 'counter', f"{counter}{suffix} {stat.total:g}")
+    return "".join(line + "\n" for lines in families.values() for line in lines)
+
+
+def write_textfile(path: str, stats: Dict[str, Stat]) -> None:
+    # Written next to the target and renamed, so the node exporter never reads half a file
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as file:
+            file.write(prometheus(stats))
+        os.replace(temporary, path)
+    except Exception as e:
+        logger.error(f"Error writing metrics to {path}: {e}")
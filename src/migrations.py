@@ -0,0 +1,398 @@
+import logging
+import sqlite3
+import zlib
+from typing import Callable, List, Optional
+
+
+logger = logging.getLogger('faria_logger')
+
+
+def _inflate(body: Optional[bytes]) -> Optional[str]:
+    return None if body is None else zlib.decompress(body).decode('utf-8')
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    """SQL functions the schema relies on; every connection that writes videos, transcripts or summaries needs them."""
+    # videos_search inflates the compressed transcripts and summaries for the search index
+    conn.create_function('inflate', 1, _inflate, deterministic=True)
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _create_videos(conn: sqlite3.Connection) -> None:
+    columns = _columns(conn, 'videos')
+    if not columns:
+        conn.execute('''
+        CREATE TABLE videos (
+            id TEXT PRIMARY KEY,
+            channel TEXT NOT NULL,
+            duration TEXT,
+            title TEXT NOT NULL,
+            transcription TEXT,
+            summary TEXT,
+            watched INTEGER DEFAULT 0,
+            ditched INTEGER DEFAULT 0,
+            published_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        return
+
+    # Databases created by the old db/create.py used disliked and created_at
+    if 'disliked' in columns and 'ditched' not in columns:
+        conn.execute('ALTER TABLE videos RENAME COLUMN disliked TO ditched')
+    if 'created_at' in columns and 'published_at' not in columns:
+        conn.execute('ALTER TABLE videos RENAME COLUMN created_at TO published_at')
+
+
+def _index_hot_queries(conn: sqlite3.Connection) -> None:
+    # get_latest_video_date_for_channel: MAX(published_at) WHERE channel = ?
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_videos_channel_published ON videos(channel, published_at)')
+    # get_unwatched_videos: the partial index only holds the rows the TUI lists
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_videos_unwatched ON videos(published_at)
+    WHERE watched = 0 AND ditched = 0
+    ''')
+
+
+def _move_text_to_side_tables(conn: sqlite3.Connection) -> None:
+    # Transcripts and summaries are zlib-compressed and only read when a popup needs them
+    for table, column in (('transcripts', 'transcription'), ('summaries', 'summary')):
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            video_id TEXT PRIMARY KEY REFERENCES videos(id) ON DELETE CASCADE,
+            body BLOB NOT NULL
+        )
+        ''')
+        if column not in _columns(conn, 'videos'):
+            continue
+        rows = conn.execute(f"SELECT id, {column} FROM videos WHERE {column} IS NOT NULL AND {column} != ''")
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table}(video_id, body) VALUES (?, ?)",
+            ((video_id, zlib.compress(text.encode('utf-8'))) for video_id, text in rows.fetchall())
+        )
+        conn.execute(f"ALTER TABLE videos DROP COLUMN {column}")
+
+
+def _create_channels(conn: sqlite3.Connection) -> None:
+    # Channel metadata cache; fetched_at is only set by a channels().list lookup
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS channels (
+        id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        uploads_playlist_id TEXT,
+        fetched_at TIMESTAMP
+    )
+    ''')
+
+
+def _create_sync_state(conn: sqlite3.Connection) -> None:
+    # Per-channel feed cursor: newest upload seen and the ETag of the first uploads page
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        channel_id TEXT PRIMARY KEY,
+        last_video_id TEXT,
+        last_published_at TEXT,
+        etag TEXT,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def _create_summary_cache(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS summary_cache (
+        key TEXT PRIMARY KEY,
+        body BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        last_used_at REAL NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache(last_used_at)')
+
+
+def _create_jobs(conn: sqlite3.Connection) -> None:
+    # Background summary jobs; state is pending, running, done or failed
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        video_id TEXT PRIMARY KEY REFERENCES videos(id) ON DELETE CASCADE,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs(state) WHERE state IN ('pending', 'running')")
+
+
+def _add_summary_usage(conn: sqlite3.Connection) -> None:
+    # Gemini token usage of each stored summary, to see what every video cost
+    columns = _columns(conn, 'summaries')
+    for column in ('prompt_tokens', 'output_tokens'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE summaries ADD COLUMN {column} INTEGER")
+
+
+def _index_unwatched_keyset(conn: sqlite3.Connection) -> None:
+    # Keyset pagination orders by (published_at, id), so the partial index needs id as a tiebreaker
+    conn.execute('DROP INDEX IF EXISTS idx_videos_unwatched')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_videos_unwatched_keyset ON videos(published_at, id)
+    WHERE watched = 0 AND ditched = 0
+    ''')
+
+
+def _create_search_index(conn: sqlite3.Connection) -> None:
+    # videos_fts shares its rowid with videos. The triggers keep title and channel in sync;
+    # transcripts and summaries are compressed, so VideoDatabase indexes them as it stores the text.
+    conn.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+        title, channel, transcript, summary,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+        INSERT INTO videos_fts(rowid, title, channel) VALUES (new.rowid, new.title, new.channel);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF title, channel ON videos BEGIN
+        UPDATE videos_fts SET title = new.title, channel = new.channel WHERE rowid = new.rowid;
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+        DELETE FROM videos_fts WHERE rowid = old.rowid;
+    END
+    ''')
+
+    # Stored as the default rank, so ORDER BY rank weighs a title match over a transcript match
+    conn.execute("INSERT INTO videos_fts(videos_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 2.0)')")
+
+    conn.execute('DELETE FROM videos_fts')
+    conn.execute('INSERT INTO videos_fts(rowid, title, channel) SELECT rowid, title, channel FROM videos')
+    for table, column in (('transcripts', 'transcript'), ('summaries', 'summary')):
+        rows = conn.execute(f"SELECT v.rowid, t.body FROM {table} t JOIN videos v ON v.id = t.video_id")
+        conn.executemany(
+            f"UPDATE videos_fts SET {column} = ? WHERE rowid = ?",
+            ((zlib.decompress(body).decode('utf-8'), rowid) for rowid, body in rows.fetchall())
+        )
+
+
+def _add_transcript_snippets(conn: sqlite3.Connection) -> None:
+    # zlib-compressed JSON list of {text, start, duration}; the joined text in body has no timestamps
+    if 'snippets' not in _columns(conn, 'transcripts'):
+        conn.execute('ALTER TABLE transcripts ADD COLUMN snippets BLOB')
+
+
+def _create_transcript_failures(conn: sqlite3.Connection) -> None:
+    # Negative cache: videos whose transcript could not be fetched are not asked for again before retry_after
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS transcript_failures (
+        video_id TEXT PRIMARY KEY REFERENCES videos(id) ON DELETE CASCADE,
+        reason TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 1,
+        retry_after REAL NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def _create_settings(conn: sqlite3.Connection) -> None:
+    # Small values resolved once through the API and kept, like the id of the playlist videos are added to
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+
+
+def _create_playlist_outbox(conn: sqlite3.Connection) -> None:
+    # Videos waiting to be added to the playlist; a row is deleted once the insert went through
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS playlist_outbox (
+        video_id TEXT PRIMARY KEY REFERENCES videos(id) ON DELETE CASCADE,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def _create_metrics(conn: sqlite3.Connection) -> None:
+    # Timers and counters summed over every run; a timer's latencies go in metric_buckets,
+    # one row per histogram bucket keyed by its upper bound
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS metrics (
+        name TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        total REAL NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS metric_buckets (
+        name TEXT NOT NULL REFERENCES metrics(name) ON DELETE CASCADE,
+        le REAL NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (name, le)
+    )
+    ''')
+
+
+def _text_seconds(text: str) -> int:
+    # The display strings stored before this migration: "M:SS" or "H:MM:SS"
+    seconds = 0
+    try:
+        for part in text.split(':'):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return 0
+    return seconds
+
+
+def _store_duration_seconds(conn: sqlite3.Connection) -> None:
+    # Whole seconds so the list can be filtered and sorted by length, 0 when YouTube reports none.
+    # The new column takes the old one's name, so queries and video dicts keep using duration.
+    conn.execute('ALTER TABLE videos ADD COLUMN duration_seconds INTEGER NOT NULL DEFAULT 0')
+    rows = conn.execute("SELECT rowid, duration FROM videos WHERE duration IS NOT NULL AND duration != ''")
+    conn.executemany(
+        'UPDATE videos SET duration_seconds = ? WHERE rowid = ?',
+        [(_text_seconds(str(text)), rowid) for rowid, text in rows.fetchall()]
+    )
+    conn.execute('ALTER TABLE videos DROP COLUMN duration')
+    conn.execute('ALTER TABLE videos RENAME COLUMN duration_seconds TO duration')
+    # Sort by length pages over (duration, id) and a max length is a range of it; newest first
+    # filters the keyset index on duration without reading the rows it leaves out
+    conn.execute('DROP INDEX IF EXISTS idx_videos_unwatched_keyset')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_videos_unwatched_keyset ON videos(published_at, id, duration)
+    WHERE watched = 0 AND ditched = 0
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_videos_unwatched_duration ON videos(duration, id)
+    WHERE watched = 0 AND ditched = 0
+    ''')
+
+
+def _update_search_index_on_change(conn: sqlite3.Connection) -> None:
+    # The upsert sets title and channel on every change; updating videos_fts re-indexes the
+    # whole row, transcript included, so it only happens when one of them really changed
+    conn.execute('DROP TRIGGER IF EXISTS videos_fts_update')
+    conn.execute('''
+    CREATE TRIGGER videos_fts_update AFTER UPDATE OF title, channel ON videos
+    WHEN old.title IS NOT new.title OR old.channel IS NOT new.channel BEGIN
+        UPDATE videos_fts SET title = new.title, channel = new.channel WHERE rowid = new.rowid;
+    END
+    ''')
+
+
+def _add_job_claims(conn: sqlite3.Connection) -> None:
+    # Who runs a running job, as host:pid:token, and when it last said it still does, in unix time.
+    # Startup resets only the claims nobody keeps alive, not those of another process still at work
+    conn.execute('ALTER TABLE jobs ADD COLUMN claimed_by TEXT')
+    conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+
+
+def _index_search_from_side_tables(conn: sqlite3.Connection) -> None:
+    # A regular FTS5 table keeps an uncompressed copy of every transcript and summary, more than
+    # their compressed side tables take. As an external-content table videos_fts only indexes, and
+    # reads the text through videos_search. Removing an entry takes the text it was made of, so the
+    # triggers read it back from the view before the row changes; VideoDatabase does the same when
+    # it stores a transcript or summary. The last search index copy is freed, not returned to the OS.
+    for trigger in ('insert', 'update', 'delete'):
+        conn.execute(f'DROP TRIGGER IF EXISTS videos_fts_{trigger}')
+    conn.execute('DROP TABLE IF EXISTS videos_fts')
+    conn.execute('''
+    CREATE VIEW IF NOT EXISTS videos_search AS
+    SELECT v.rowid AS video_rowid, v.title, v.channel, inflate(t.body) AS transcript, inflate(s.body) AS summary
+    FROM videos v
+    LEFT JOIN transcripts t ON t.video_id = v.id
+    LEFT JOIN summaries s ON s.video_id = v.id
+    ''')
+    conn.execute('''
+    CREATE VIRTUAL TABLE videos_fts USING fts5(
+        title, channel, transcript, summary,
+        content = 'videos_search', content_rowid = 'video_rowid',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    ''')
+    conn.execute("INSERT INTO videos_fts(videos_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 2.0)')")
+    conn.execute('''
+    CREATE TRIGGER videos_fts_insert AFTER INSERT ON videos BEGIN
+        INSERT INTO videos_fts(rowid, title, channel) VALUES (new.rowid, new.title, new.channel);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER videos_fts_update AFTER UPDATE OF title, channel ON videos
+    WHEN old.title IS NOT new.title OR old.channel IS NOT new.channel BEGIN
+        INSERT INTO videos_fts(videos_fts, rowid, title, channel, transcript, summary)
+        SELECT 'delete', video_rowid, old.title, old.channel, transcript, summary
+        FROM videos_search WHERE video_rowid = old.rowid;
+        INSERT INTO videos_fts(rowid, title, channel, transcript, summary)
+        SELECT video_rowid, title, channel, transcript, summary FROM videos_search WHERE video_rowid = new.rowid;
+    END
+    ''')
+    # Before the delete, while the cascade has not removed the transcript and summary yet
+    conn.execute('''
+    CREATE TRIGGER videos_fts_delete BEFORE DELETE ON videos BEGIN
+        INSERT INTO videos_fts(videos_fts, rowid, title, channel, transcript, summary)
+        SELECT 'delete', video_rowid, title, channel, transcript, summary
+        FROM videos_search WHERE video_rowid = old.rowid;
+    END
+    ''')
+    conn.execute("INSERT INTO videos_fts(videos_fts) VALUES ('rebuild')")
+
+
+# Append only: the position in this list is the schema version stored in PRAGMA user_version
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _create_videos,
+    _index_hot_queries,
+    _move_text_to_side_tables,
+    _create_channels,
+    _create_sync_state,
+    _create_summary_cache,
+    _create_jobs,
+    _add_summary_usage,
+    _index_unwatched_keyset,
+    _create_search_index,
+    _add_transcript_snippets,
+    _create_transcript_failures,
+    _create_settings,
+    _create_playlist_outbox,
+    _create_metrics,
+    _store_duration_seconds,
+    _update_search_index_on_change,
+    _add_job_claims,
+    _index_search_from_side_tables,
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    version = schema_version(conn)
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info(f"Migrating database to version {target} ({migration.__name__})")
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # A concurrent process may have applied it between our read and the lock
+            if schema_version(conn) >= target:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from src.database import VideoDatabase
+from src.rate_limit import QuotaExhausted
+
+
+logger = logging.getLogger('faria_logger')
+
+# Once the daily quota is gone, the outbox waits this long before trying again
+QUOTA_RETRY_DELAY = 3600
+
+
+class PlaylistOutbox:
+    """Videos waiting to be added to the playlist, kept in the playlist_outbox table.
+
+    add() only writes the outbox row, so the caller never waits on the API; a background
+    thread sends the entries with insert(video_id). Failed inserts are retried with
+    exponential backoff and given up after max_attempts. Entries survive a restart and
+    are sent by the next start().
+    """
+
+    def __init__(self, db: VideoDatabase,
+                 insert: Callable[[str], None],
+                 max_attempts: int = 5,
+                 retry_delay: float = 30,
+                 max_delay: float = 3600):
+        self._db = db
+        self._insert = insert
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._max_delay = max_delay
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="playlist-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def add(self, video_id: str) -> bool:
+        if not self._db.add_to_playlist_outbox(video_id):
+            return False
+        self._wake.set()
+        return True
+
+    def drain(self) -> int:
+        """Send every entry that is due, returns how many went through."""
+        sent = 0
+        for item in self._db.get_due_playlist_items(time.time()):
+            if self._stopping.is_set():
+                break
+            video_id = item['video_id']
+            try:
+                self._insert(video_id)
+            except QuotaExhausted as e:
+                logger.warning(f"Playlist outbox paused: {e}")
+                self._db.postpone_playlist_items(time.time() + QUOTA_RETRY_DELAY)
+                break
+            except Exception as e:
+                self._failed(video_id, item['attempts'] + 1, str(e))
+                continue
+            self._db.remove_from_playlist_outbox(video_id)
+            sent += 1
+        return sent
+
+    def _failed(self, video_id: str, attempts: int, error: str) -> None:
+        if attempts >= self._max_attempts:
+            logger.error(f"Giving up adding {video_id} to the playlist after {attempts} attempts: {error}")
+            self._db.retry_playlist_item(video_id, error, None)
+            return
+        delay = min(self._max_delay, self._retry_delay * 2 ** (attempts - 1))
+        logger.warning(f"Adding {video_id} to the playlist failed, retrying in {delay:.0f}s: {error}")
+        self._db.retry_playlist_item(video_id, error, time.time() + delay)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                sent = self.drain()
+                if sent:
+                    logger.info(f"Added {sent} videos to the playlist")
+            except Exception as e:
+                logger.exception(f"Playlist outbox crashed: {e}")
+            # Sleep until the next retry is due, or until add() or stop() wake us up
+            next_attempt = self._db.get_next_playlist_attempt()
+            timeout = None if next_attempt is None else max(1.0, next_attempt - time.time())
+            self._wake.wait(timeout)
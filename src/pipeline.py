@@ -0,0 +1,222 @@
+import logging
+import queue
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from src.database import CLAIM_HEARTBEAT_SECONDS, VideoDatabase, new_claim_owner
+from src.rate_limit import QuotaExhausted
+from src.transcripts import snippet_texts
+
+
+logger = logging.getLogger('faria_logger')
+
+# Results are committed at least this often, even when a batch is not full yet
+FLUSH_INTERVAL = 5.0
+_STOP = None
+
+
+class StageStats:
+    """How many items a stage handled and how long each one took."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.succeeded = 0
+        self.failed = 0
+        self._latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def report(self) -> str:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return f"{self.name:<12}nothing to do"
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        return (f"{self.name:<12}{self.succeeded:>6} ok {self.failed:>5} failed"
+                f"   mean {statistics.mean(latencies):6.2f}s   p50 {statistics.median(latencies):6.2f}s   p95 {p95:6.2f}s")
+
+
+class Pipeline:
+    """Transcripts and summaries for the unwatched backlog, without the TUI.
+
+    Fetching transcripts and summarizing are stages with their own number of threads,
+    connected by bounded queues so a slow stage holds back the one before it instead
+    of piling up work. A single writer thread commits results batch_size jobs at a time.
+
+    Work comes from the jobs table, which makes a run resumable: jobs an interrupted
+    run left running are pending again on the next run, and only the summaries of the
+    last uncommitted batch are redone. The writer keeps this run's claims alive, so a
+    TUI or another run starting meanwhile does not take its jobs back.
+    fetch_transcript(video_id) returns the stored transcript or fetches and stores it,
+    so no fetched transcript is ever lost.
+    summarize(transcript, usage, snippets) fills usage with the tokens it spent; snippets
+    are the texts long transcripts are chunked between. Once it raises
+    QuotaExhausted the remaining jobs go back to pending without using up an attempt,
+    for the first run after the quota resets.
+    """
+
+    def __init__(self, db: VideoDatabase,
+                 fetch_transcript: Callable[[str], Optional[str]],
+                 summarize: Callable[[str, Dict[str, int], Optional[List[str]]], Optional[str]],
+                 transcript_workers: int = 4,
+                 summary_workers: int = 2,
+                 batch_size: int = 20,
+                 max_attempts: int = 3):
+        self._db = db
+        self._fetch_transcript = fetch_transcript
+        self._summarize = summarize
+        self._transcript_workers = max(1, transcript_workers)
+        self._summary_workers = max(1, summary_workers)
+        self._batch_size = max(1, batch_size)
+        self._max_attempts = max_attempts
+        self._transcripts: queue.Queue = queue.Queue(maxsize=self._transcript_workers * 2)
+        self._summaries: queue.Queue = queue.Queue(maxsize=self._summary_workers * 2)
+        self._results: queue.Queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._quota_exhausted = threading.Event()
+        self._owner = new_claim_owner()
+        self.stats = {name: StageStats(name) for name in ('transcripts', 'summaries', 'commits')}
+        self.elapsed = 0.0
+
+    def run(self, limit: Optional[int] = None) -> Dict[str, StageStats]:
+        """Summarize up to limit videos, pending jobs first. Ctrl-C commits what is done and stops."""
+        start = time.perf_counter()
+        self._db.reset_running_jobs()
+        self._db.enqueue_jobs(self._db.get_unsummarized_video_ids(limit))
+        jobs = self._db.claim_jobs(self._owner, limit)
+        logger.info(f"Pipeline claimed {len(jobs)} jobs")
+
+        writer = self._start([self._write], 'pipeline-writer')[0]
+        try:
+            transcript_threads = self._start([self._fetch_transcripts] * self._transcript_workers, 'pipeline-transcripts')
+            summary_threads = self._start([self._summarize_transcripts] * self._summary_workers, 'pipeline-summaries')
+            for job in jobs:
+                self._transcripts.put(job)
+            self._stop_stage(self._transcripts, transcript_threads)
+            self._stop_stage(self._summaries, summary_threads)
+        except KeyboardInterrupt:
+            logger.info("Pipeline interrupted, committing finished jobs")
+            self._stopping.set()
+        self._results.put(_STOP)
+        writer.join()
+        if self._stopping.is_set():
+            # Whatever was still in flight is redone by the next run
+            self._db.reset_running_jobs(self._owner)
+        self.elapsed = time.perf_counter() - start
+        return self.stats
+
+    def report(self) -> str:
+        summarized = self.stats['summaries'].succeeded
+        per_minute = summarized / (self.elapsed / 60) if self.elapsed else 0.0
+        lines = [stats.report() for stats in self.stats.values()]
+        lines.append(f"{summarized} videos summarized in {self.elapsed:.1f}s ({per_minute:.1f} videos/min)")
+        return "\n".join(lines)
+
+    def _start(self, targets: List[Callable[[], None]], name: str) -> List[threading.Thread]:
+        # Daemon threads, so an interrupted run does not wait for requests still in flight
+        threads = [threading.Thread(target=target, name=f"{name}-{i}", daemon=True) for i, target in enumerate(targets)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _stop_stage(self, stage: queue.Queue, threads: List[threading.Thread]) -> None:
+        for _ in threads:
+            stage.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    def _jobs(self, stage: queue.Queue):
+        while not self._stopping.is_set():
+            job = stage.get()
+            if job is _STOP:
+                return
+            yield job
+
+    def _fetch_transcripts(self) -> None:
+        for job in self._jobs(self._transcripts):
+            video_id = job['video_id']
+            if self._quota_exhausted.is_set():
+                # No summary could be made of it before the quota resets, the next run fetches it
+                self._results.put(('release', video_id))
+                continue
+            start = time.perf_counter()
+            try:
+                transcript = self._fetch_transcript(video_id)
+            except Exception as e:
+                logger.error(f"Error fetching transcript for {video_id}: {e}")
+                transcript = None
+            self.stats['transcripts'].record(time.perf_counter() - start, bool(transcript))
+            if not transcript:
+                self._results.put(('job', video_id, 'failed', 'No transcript available'))
+                continue
+            self._summaries.put((job, transcript))
+
+    def _summarize_transcripts(self) -> None:
+        for job, transcript in self._jobs(self._summaries):
+            video_id = job['video_id']
+            if self._quota_exhausted.is_set():
+                self._results.put(('release', video_id))
+                continue
+            start = time.perf_counter()
+            usage: Dict[str, int] = {}
+            try:
+                summary = self._summarize(transcript, usage, snippet_texts(self._db, video_id))
+                error = None if summary else 'Summarization returned nothing'
+            except QuotaExhausted as e:
+                if not self._quota_exhausted.is_set():
+                    self._quota_exhausted.set()
+                    logger.warning(f"Summaries stopped until the quota resets in {e.retry_after / 3600:.1f}h: {e}")
+                self._results.put(('release', video_id))
+                continue
+            except Exception as e:
+                summary, error = None, str(e)
+            self.stats['summaries'].record(time.perf_counter() - start, bool(summary))
+            if summary:
+                self._results.put(('summary', video_id, summary, usage))
+            else:
+                # Retried by the next run until it has used up its attempts
+                state = 'failed' if job['attempts'] >= self._max_attempts else 'pending'
+                self._results.put(('job', video_id, state, error))
+
+    def _write(self) -> None:
+        summaries, jobs, released = [], [], []
+        last_commit = last_heartbeat = time.monotonic()
+        while True:
+            try:
+                result = self._results.get(timeout=FLUSH_INTERVAL)
+                if result is _STOP:
+                    break
+                kind, video_id, *values = result
+                if kind == 'summary':
+                    summaries.append((video_id, *values))
+                    jobs.append((video_id, 'done', None))
+                elif kind == 'release':
+                    released.append(video_id)
+                else:
+                    jobs.append((video_id, *values))
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_heartbeat >= CLAIM_HEARTBEAT_SECONDS:
+                self._db.touch_jobs(self._owner)
+                last_heartbeat = time.monotonic()
+            overdue = time.monotonic() - last_commit >= FLUSH_INTERVAL
+            if len(jobs) + len(released) >= self._batch_size or (overdue and (jobs or released)):
+                self._commit(summaries, jobs, released)
+                summaries, jobs, released = [], [], []
+                last_commit = time.monotonic()
+        if jobs or released:
+            self._commit(summaries, jobs, released)
+
+    def _commit(self, summaries: List[Any], jobs: List[Any], released: List[str]) -> None:
+        start = time.perf_counter()
+        ok = self._db.save_job_results(summaries, jobs, released)
+        self.stats['commits'].record(time.perf_counter() - start, ok)
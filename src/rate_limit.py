@@ -0,0 +1,218 @@
+import configparser
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from src import metrics
+from src.database import VideoDatabase
+from src.utils import get_conf
+
+
+logger = logging.getLogger('faria_logger')
+
+
+class QuotaExhausted(Exception):
+    """The daily quota is used up; retry_after is how many seconds are left until it resets."""
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute, holding at most one minute of tokens."""
+
+    def __init__(self, rate_per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_minute / 60)
+        self._updated = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens if possible and return 0, otherwise return how many seconds to wait."""
+        with self._lock:
+            self._refill()
+            # A request bigger than the whole bucket goes through once it is full and leaves a debt
+            needed = min(amount, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= amount
+                return 0
+            return (needed - self._tokens) * 60 / self.rate_per_minute
+
+    def acquire(self, amount: float = 1) -> None:
+        while True:
+            wait = self.reserve(amount)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Per-service budget: requests/min, tokens/min and daily quota units, each optional.
+
+    A rate-limited response pauses the whole service, so every thread backs off
+    together instead of each one hammering the API until it gets its own 429.
+    With a store, the daily quota usage is kept in the database and shared by every
+    process; without one it is counted by this process alone.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 daily_quota: int = 0, store: Optional[VideoDatabase] = None):
+        self.name = name
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.daily_quota = daily_quota
+        self._store = store
+        self._quota_used = 0
+        self._exhausted = False
+        # Quota days are counted in UTC; YouTube resets at Pacific midnight, so this is conservative for part of the day
+        self._quota_day = self._today()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    @staticmethod
+    def seconds_until_reset() -> float:
+        now = datetime.now(timezone.utc)
+        midnight = datetime(now.year, now.month, now.day, tzinfo=timezone.utc) + timedelta(days=1)
+        return (midnight - now).total_seconds()
+
+    def acquire(self, tokens: float = 0, quota_units: int = 1) -> None:
+        with self._lock:
+            if self._quota_day != self._today():
+                self._quota_day = self._today()
+                self._quota_used = 0
+                self._exhausted = False
+            if self._exhausted:
+                raise QuotaExhausted(f"{self.name} daily quota used up", self.seconds_until_reset())
+            if self.daily_quota and self._store is not None:
+                counted, self._quota_used = self._store.add_quota_usage(self.name, self._quota_day, quota_units,
+                                                                        self.daily_quota)
+            else:
+                counted = not self.daily_quota or self._quota_used + quota_units <= self.daily_quota
+                if counted:
+                    self._quota_used += quota_units
+            if not counted:
+                raise QuotaExhausted(f"{self.name} daily quota of {self.daily_quota} units used up",
+                                     self.seconds_until_reset())
+            pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        if self._requests:
+            self._requests.acquire(1)
+        if self._tokens and tokens:
+            self._tokens.acquire(tokens)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def exhaust(self) -> None:
+        # The API says the daily quota is gone, whatever our own count says
+        with self._lock:
+            if self.daily_quota and self._store is not None:
+                # A whole quota on top of the day's usage stops the other processes too
+                self._quota_used = self._store.add_quota_usage(self.name, self._today(), self.daily_quota)[1]
+            self._quota_used = max(self._quota_used, self.daily_quota)
+            self._exhausted = True
+
+    def budget(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.daily_quota and self._store is not None:
+                self._quota_used = self._store.get_quota_usage(self.name, self._today())
+            return {
+                'requests_available': self._requests.available() if self._requests else None,
+                'tokens_available': self._tokens.available() if self._tokens else None,
+                'quota_used': self._quota_used,
+                'quota_remaining': self.daily_quota - self._quota_used if self.daily_quota else None,
+                'paused_for': max(0.0, self._paused_until - time.monotonic()),
+            }
+
+
+def call_with_backoff(limiter: RateLimiter, call: Callable[[], Any], is_rate_limited: Callable[[Exception], bool],
+                      tokens: float = 0, quota_units: int = 1, max_retries: int = 5,
+                      base_delay: float = 2, max_delay: float = 300) -> Any:
+    """Run call() within the limiter's budget, retrying rate-limited failures with exponential backoff and full jitter."""
+    for attempt in range(max_retries + 1):
+        with metrics.timer('rate_limit_wait', service=limiter.name):
+            limiter.acquire(tokens, quota_units)
+        try:
+            return call()
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limited(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning(f"{limiter.name} rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}): {e}")
+            limiter.pause(delay)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(service: str) -> RateLimiter:
+    """Process-wide limiter for a service, configured from the [RateLimit] section of config.ini.
+    Its daily quota usage is shared with the other processes through the database."""
+    with _limiters_lock:
+        limiter = _limiters.get(service)
+        if limiter is None:
+            daily_quota = int(_conf(service, 'daily_quota'))
+            limiter = RateLimiter(
+                service,
+                requests_per_minute=float(_conf(service, 'requests_per_minute')),
+                tokens_per_minute=float(_conf(service, 'tokens_per_minute')),
+                daily_quota=daily_quota,
+                store=VideoDatabase() if daily_quota else None,
+            )
+            _limiters[service] = limiter
+        return limiter
+
+
+def set_limiter(service: str, limiter: RateLimiter) -> None:
+    """Replace the service's limiter, e.g. with an unlimited RateLimiter(service) to time fake backends."""
+    with _limiters_lock:
+        _limiters[service] = limiter
+
+
+def report() -> str:
+    """What is left of the budget of every service used so far by this process; - where none is set."""
+    with _limiters_lock:
+        limiters = sorted(_limiters.items())
+    if not limiters:
+        return ""
+
+    def amount(value: Any) -> str:
+        return '-' if value is None else f"{value:.0f}"
+
+    lines = [f"{'budget':<16}{'requests':>10}{'tokens':>10}{'quota used':>12}{'quota left':>12}{'paused':>9}"]
+    for name, limiter in limiters:
+        budget = limiter.budget()
+        lines.append(f"{name:<16}{amount(budget['requests_available']):>10}{amount(budget['tokens_available']):>10}"
+                     f"{budget['quota_used']:>12}{amount(budget['quota_remaining']):>12}{budget['paused_for']:>8.0f}s")
+    return "\n".join(lines)
+
+
+def _conf(service: str, option: str) -> str:
+    # A budget missing from config.ini is not enforced
+    try:
+        return get_conf('RateLimit', f"{service}_{option}")
+    except configparser.NoOptionError:
+        return '0'
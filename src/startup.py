@@ -0,0 +1,22 @@
+import time
+from typing import List, Tuple
+
+
+# Imported first by main.py, so phases are timed from right after the interpreter is up
+_started = time.perf_counter()
+_last = _started
+_phases: List[Tuple[str, float]] = []
+
+
+def mark(phase: str) -> None:
+    """Close the current startup phase under the given name."""
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+
+def report() -> str:
+    lines = [f"{phase:<24}{seconds * 1000:>9.1f} ms" for phase, seconds in _phases]
+    lines.append(f"{'total':<24}{(_last - _started) * 1000:>9.1f} ms")
+    return "\n".join(lines)
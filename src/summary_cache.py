@@ -0,0 +1,43 @@
+import hashlib
+import threading
+from typing import Dict, Optional
+
+from src.database import VideoDatabase
+
+
+class SummaryCache:
+    """Content-addressed store of model outputs, keyed by transcript hash, prompt template and model.
+
+    The key hashes the template text as well as its id, so editing a template, e.g. through
+    a file in prompts_dir, stops the outputs of the old one from being served. Entries live in the summary_cache table and the least recently used ones are
+    evicted once the stored text goes over max_bytes.
+    """
+
+    def __init__(self, db: VideoDatabase, max_bytes: int):
+        self._db = db
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, prompt_id: str, template: str, model: str) -> str:
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        template_digest = hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+        return f"{digest}:{prompt_id}:{template_digest}:{model}"
+
+    def get(self, text: str, prompt_id: str, template: str, model: str) -> Optional[str]:
+        summary = self._db.get_cached_summary(self.key(text, prompt_id, template, model))
+        with self._lock:
+            if summary is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return summary
+
+    def put(self, text: str, prompt_id: str, template: str, model: str, summary: str) -> bool:
+        return self._db.put_cached_summary(self.key(text, prompt_id, template, model), summary, self.max_bytes)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
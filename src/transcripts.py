@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src import metrics
+from src.database import VideoDatabase
+from src.rate_limit import call_with_backoff, get_limiter
+
+
+logger = logging.getLogger('faria_logger')
+
+LANGUAGES = ['it', 'en']
+
+# How long a failure is trusted before the transcript is asked for again. The wait doubles
+# with every failed attempt, up to MAX_RETRY_AFTER.
+RETRY_AFTER = {
+    'disabled': 7 * 24 * 3600,
+    'not available': 24 * 3600,
+    # Premieres, live streams and uploads still processing get their captions later
+    'not yet': 3600,
+    'error': 15 * 60,
+}
+MAX_RETRY_AFTER = 30 * 24 * 3600
+
+_local = threading.local()
+
+
+class TranscriptUnavailable(Exception):
+    """A transcript could not be fetched; reason is one of the RETRY_AFTER keys."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(f"{reason}: {message}")
+        self.reason = reason
+
+
+def _reason(error: Exception) -> str:
+    from youtube_transcript_api import (CouldNotRetrieveTranscript, RequestBlocked, TranscriptsDisabled, VideoUnplayable,
+                                        YouTubeRequestFailed)
+
+    if isinstance(error, TranscriptsDisabled):
+        return 'disabled'
+    if isinstance(error, VideoUnplayable):
+        return 'not yet'
+    # Blocked or failed requests say nothing about the video itself
+    if isinstance(error, CouldNotRetrieveTranscript) and not isinstance(error, (RequestBlocked, YouTubeRequestFailed)):
+        return 'not available'
+    return 'error'
+
+
+def _api():
+    # One client per thread, so each keeps its own HTTP session and connection pool. The
+    # library is imported here rather than at startup, it is only needed once a fetch goes out.
+    api = getattr(_local, 'api', None)
+    if api is None:
+        from youtube_transcript_api import YouTubeTranscriptApi
+        api = _local.api = YouTubeTranscriptApi()
+    return api
+
+
+def _is_blocked(error: Exception) -> bool:
+    from youtube_transcript_api import RequestBlocked
+    return isinstance(error, RequestBlocked)
+
+
+def fetch_snippets(video_id: str) -> List[Dict[str, Any]]:
+    """The transcript as {text, start, duration} snippets, raises TranscriptUnavailable."""
+    def fetch():
+        with metrics.timer('transcript_fetch'):
+            return _api().fetch(video_id, LANGUAGES)
+
+    try:
+        transcript = call_with_backoff(get_limiter('transcripts'), fetch, is_rate_limited=_is_blocked)
+    except Exception as e:
+        reason = _reason(e)
+        metrics.count('transcript_failures', reason=reason)
+        raise TranscriptUnavailable(reason, str(e).splitlines()[0] if str(e) else type(e).__name__) from e
+    return [{'text': item.text, 'start': item.start, 'duration': item.duration} for item in transcript.snippets]
+
+
+def join_snippets(snippets: List[Dict[str, Any]]) -> str:
+    return " ".join(snippet['text'] for snippet in snippets)
+
+
+def snippet_texts(db: VideoDatabase, video_id: str) -> Optional[List[str]]:
+    """The texts of the stored transcript's snippets, which long transcripts are chunked between;
+    None for transcripts stored without them."""
+    snippets = db.get_transcript_snippets(video_id)
+    return [snippet['text'] for snippet in snippets] if snippets else None
+
+
+def retry_after(reason: str, attempts: int, now: float) -> float:
+    return now + min(MAX_RETRY_AFTER, RETRY_AFTER[reason] * 2 ** (attempts - 1))
+
+
+class TranscriptFetcher:
+    """Transcripts read from the database, or fetched and stored with their snippets.
+
+    Videos whose transcript could not be fetched are kept in a negative cache with a
+    retry_after, and are not asked for again until it has passed. prefetch() fetches
+    many transcripts concurrently and stores them batch_size at a time.
+    """
+
+    def __init__(self, db: VideoDatabase,
+                 fetch: Callable[[str], List[Dict[str, Any]]] = fetch_snippets,
+                 workers: int = 4,
+                 batch_size: int = 20):
+        self._db = db
+        self._fetch = fetch
+        self._workers = max(1, workers)
+        self._batch_size = max(1, batch_size)
+
+    def get(self, video_id: str) -> Optional[str]:
+        transcript = self._db.get_transcription(video_id)
+        if transcript:
+            return transcript
+        due, attempts = self._due([video_id])
+        if not due:
+            return None
+        fetched, _ = self._store([self._fetch_one(video_id)], attempts)
+        return fetched[0][1] if fetched else None
+
+    def prefetch(self, video_ids: List[str]) -> List[str]:
+        """Fetch the transcripts of video_ids that are neither stored nor failing, returns the ids stored."""
+        video_ids = list(dict.fromkeys(video_ids))
+        transcribed = self._db.get_transcribed_video_ids(video_ids)
+        due, attempts = self._due([video_id for video_id in video_ids if video_id not in transcribed])
+        if not due:
+            return []
+        start = time.perf_counter()
+        stored: List[str] = []
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='transcripts') as pool:
+            results = []
+            for result in pool.map(self._fetch_one, due):
+                results.append(result)
+                if len(results) >= self._batch_size:
+                    fetched, failures = self._store(results, attempts)
+                    stored.extend(video_id for video_id, _, _ in fetched)
+                    failed += len(failures)
+                    results = []
+            if results:
+                fetched, failures = self._store(results, attempts)
+                stored.extend(video_id for video_id, _, _ in fetched)
+                failed += len(failures)
+        logger.info(f"Prefetched {len(stored)} transcripts in {time.perf_counter() - start:.1f}s, "
+                    f"{failed} failed, {len(video_ids) - len(due)} stored or failing already")
+        return stored
+
+    def _due(self, video_ids: List[str]) -> Tuple[List[str], Dict[str, int]]:
+        # The ids whose last failure, if any, may be retried now, and the attempts made so far
+        now = time.time()
+        failures = self._db.get_transcript_failures(video_ids)
+        due = [video_id for video_id in video_ids
+               if video_id not in failures or failures[video_id]['retry_after'] <= now]
+        return due, {video_id: failure['attempts'] for video_id, failure in failures.items()}
+
+    def _fetch_one(self, video_id: str) -> Tuple[str, Optional[List[Dict[str, Any]]], Optional[str]]:
+        try:
+            return video_id, self._fetch(video_id), None
+        except TranscriptUnavailable as e:
+            logger.info(f"No transcript for {video_id}: {e}")
+            return video_id, None, e.reason
+
+    def _store(self, results, attempts: Dict[str, int]) -> Tuple[List[Tuple[str, str, List[Dict[str, Any]]]],
+                                                               List[Tuple[str, str, int, float]]]:
+        now = time.time()
+        fetched = [(video_id, join_snippets(snippets), snippets) for video_id, snippets, _ in results if snippets]
+        failures = []
+        for video_id, snippets, reason in results:
+            if snippets:
+                continue
+            reason = reason or 'not available'
+            failed = attempts.get(video_id, 0) + 1
+            failures.append((video_id, reason, failed, retry_after(reason, failed, now)))
+        if fetched:
+            self._db.add_transcripts(fetched)
+        if failures:
+            self._db.record_transcript_failures(failures)
+        return fetched, failures
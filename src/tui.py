@@ -1,35 +1,120 @@
-import googleapiclient
 import logging
+import re
+import threading
 import webbrowser
 from textual.app import App, ComposeResult
 from textual.containers import Vertical
 from textual.screen import ModalScreen
-from textual.widgets import DataTable, Footer, Label, TextArea
+from textual.widgets import DataTable, Footer, Input, Label, Static, TextArea
+from textual.worker import get_current_worker
 from textual.binding import Binding
 from textual.reactive import reactive
+from rich.text import Text
 import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 
+from src import metrics, rate_limit, startup
 from src.youtube_auth import get_authenticated_service
-from src.youtube_user import get_subscription_feed
-from src.database import VideoDatabase
-from src.gemini_api import get_youtube_transcript, summarize_text, extended_summarize_text
+from src.youtube_user import add_video_to_playlist, sync_subscription_feed
+from src.database import PAGE_SIZE, VideoDatabase, page_key
+from src.gemini_api import EXTENDED_PROMPT, SUMMARY_PROMPT, stream_summary, summarize_text
+from src.jobs import SummaryWorkerPool
+from src.outbox import PlaylistOutbox
+from src.transcripts import TranscriptFetcher, snippet_texts
+from src.utils import get_conf
 
 
 logger = logging.getLogger('faria_logger')
 
+COLUMNS = (("T", "transcript"), ("S", "summary"), ("Channel", "channel"), ("Length", "duration"), ("Title", "title"))
+# Control characters cannot occur in titles or transcripts, so they safely mark matches in snippets
+SEARCH_MARK = ('\x02', '\x03')
+SEARCH_DELAY = 0.15
+METRICS_REFRESH = 1.0
+# Removing a DataTable row renumbers all the others: it takes as long as adding about
+# REMOVE_ROW_COST rows, plus one more per REMOVE_ROW_COST_ROWS rows in the table
+REMOVE_ROW_COST = 10
+REMOVE_ROW_COST_ROWS = 100
+
+
+def format_duration(seconds: int) -> str:
+    if not seconds:
+        return ''
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class TitleCell(str):
+    """The title cell, which knows its video so DataTable.sort can put the rows in list order."""
+
+    def __new__(cls, title: str, video_id: str) -> 'TitleCell':
+        cell = super().__new__(cls, title)
+        cell.video_id = video_id
+        return cell
+
+
+def video_cells(video) -> Tuple[str, str, str, str, str]:
+    return (
+        'y' if video.get('has_transcript') else 'n',
+        'y' if video.get('has_summary') else 'n',
+        video.get('channel', 'No channel'),
+        format_duration(video.get('duration')),
+        TitleCell(video.get('title', 'No title'), video['id']),
+    )
+
+
+def update_flag_cells(table: DataTable, video) -> None:
+    transcript, summary, *_ = video_cells(video)
+    table.update_cell(video['id'], 'transcript', transcript)
+    table.update_cell(video['id'], 'summary', summary)
+
+
+def sync_table(table: DataTable, old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> None:
+    """Turn a table showing `old` into one showing `new`, touching only the rows that differ.
+
+    Rows are keyed by video id. DataTable can only append, so new videos are added at
+    the end and, when that is not where they belong (a refresh usually brings newer
+    ones), sorting on the title cells puts every row back in list order. Removing a
+    row renumbers all the others, so when most rows go the table is rebuilt instead.
+    """
+    new_ids = {video['id'] for video in new}
+    old_by_id = {video['id']: video for video in old}
+    removed = [video['id'] for video in old if video['id'] not in new_ids]
+    if len(removed) * (REMOVE_ROW_COST + len(old) // REMOVE_ROW_COST_ROWS) > len(new):
+        table.clear()
+        for video in new:
+            table.add_row(*video_cells(video), key=video['id'])
+        return
+
+    for video_id in removed:
+        table.remove_row(video_id)
+    for video in new:
+        previous = old_by_id.get(video['id'])
+        if previous is None:
+            table.add_row(*video_cells(video), key=video['id'])
+        elif (previous.get('has_transcript'), previous.get('has_summary')) != (video.get('has_transcript'), video.get('has_summary')):
+            update_flag_cells(table, video)
+    kept = [video['id'] for video in old if video['id'] in new_ids]
+    added = [video['id'] for video in new if video['id'] not in old_by_id]
+    if kept + added != [video['id'] for video in new]:
+        position = {video['id']: i for i, video in enumerate(new)}
+        table.sort('title', key=lambda title: position[title.video_id])
+
+
 class VideoPopup(ModalScreen):
 
     BINDINGS = [
         Binding("q", "close", "Close"),
     ]
 
-    def __init__(self, video_id: str, title: str, summary: str, *args, **kwargs):
-        if not summary:
-            raise ValueError("Summary cannot be empty")
+    def __init__(self, video_id: str, title: str, summary: str = "", *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.video_id = video_id
         self.title = title
         self.summary = summary
+        # Set when the popup closes, so a summary still streaming in stops
+        self.cancelled = threading.Event()
 
     def compose(self) -> ComposeResult:
         yield Vertical(
@@ -37,11 +122,108 @@ class VideoPopup(ModalScreen):
             TextArea(self.summary, read_only=True)
         )
 
+    def append(self, text: str) -> None:
+        self.summary += text
+        # Before compose the text is only buffered, compose then renders all of it
+        for text_area in self.query(TextArea):
+            text_area.insert(text, text_area.document.end)
 
     def action_close(self) -> None:
+        self.cancelled.set()
         self.app.pop_screen()
 
 
+def snippet_text(snippet: Optional[str]) -> Text:
+    text = Text()
+    for i, part in enumerate(re.split('[\x02\x03]', (snippet or '').replace('\n', ' '))):
+        text.append(part, style='bold' if i % 2 else '')
+    return text
+
+
+class SearchScreen(ModalScreen):
+    """Search everything in the database, results update as the query is typed.
+
+    Dismissed with the id of the selected video, or None.
+    """
+
+    BINDINGS = [
+        Binding("escape", "close", "Close"),
+    ]
+
+    def __init__(self, db: VideoDatabase, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._db = db
+        self._results: List[Dict[str, Any]] = []
+        self._timer = None
+
+    def compose(self) -> ComposeResult:
+        yield Vertical(
+            Input(placeholder="Search titles, channels, transcripts and summaries"),
+            DataTable(cursor_type='row'),
+        )
+
+    def on_mount(self) -> None:
+        self.query_one(DataTable).add_columns("Channel", "Title", "Match")
+        self.query_one(Input).focus()
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        # Wait for a pause in typing instead of searching on every keystroke
+        if self._timer is not None:
+            self._timer.stop()
+        self._timer = self.set_timer(SEARCH_DELAY, lambda: self.search(event.value))
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        if self._results:
+            self.query_one(DataTable).focus()
+
+    def search(self, text: str) -> None:
+        # Words found in nearly every transcript take a while to rank, so the query runs in a
+        # thread; a newer search cancels the older one before its results are shown
+        self.run_worker(lambda: self._search(text), thread=True, exclusive=True, group='search')
+
+    def _search(self, text: str) -> None:
+        results = self._db.search(text, mark=SEARCH_MARK)
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self._show_results, results)
+
+    def _show_results(self, results: List[Dict[str, Any]]) -> None:
+        self._results = results
+        table = self.query_one(DataTable)
+        table.clear()
+        for video in results:
+            table.add_row(video['channel'], video['title'], snippet_text(video['snippet']))
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        # Keep it from reaching the app, whose handler follows the cursor of the video list
+        event.stop()
+
+    def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+        event.stop()
+        self.dismiss(self._results[event.cursor_row]['id'])
+
+    def action_close(self) -> None:
+        self.dismiss(None)
+
+
+class MetricsPanel(Static):
+    """Latencies and counters of this session and the rate limit budgets, refreshed while the panel is shown."""
+
+    def on_mount(self) -> None:
+        self.display = False
+        self.set_interval(METRICS_REFRESH, self.refresh_metrics)
+
+    def refresh_metrics(self) -> None:
+        if not self.display:
+            return
+        if not metrics.enabled():
+            report = "Metrics are off, turn them on with [Metrics] enabled in config.ini"
+        else:
+            stats = metrics.snapshot()
+            report = metrics.report(stats) if stats else "Nothing recorded yet"
+        budgets = rate_limit.report()
+        self.update(Text(report + "\n\n" + budgets if budgets else report))
+
+
 class VideoApp(App):
 
     CSS = """
@@ -61,6 +243,12 @@ class VideoApp(App):
         transition: background 500ms, color 500ms;
     }
     
+    MetricsPanel {
+        height: auto;
+        max-height: 50%;
+        border: solid $accent;
+    }
+
     Vertical {
         align: center middle;
         padding: 2;
@@ -77,83 +265,170 @@ class VideoApp(App):
         Binding("q", "quit", "Quit"),
         Binding("r", "refresh", "Refresh"),
         Binding("w", "watch", "Watch"),
+        Binding("/", "search", "Search"),
+        Binding("m", "toggle_metrics", "Metrics"),
+        Binding("l", "cycle_max_length", "Max length"),
+        Binding("o", "toggle_order", "Sort by length"),
     ]
 
     unwatched_videos = reactive([])
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, profile_startup: bool = False, **kwargs):
         super().__init__(*args, **kwargs)
+        self._profile_startup = profile_startup
+        self._background_started = False
         self._db = VideoDatabase()
+        self._row_index = {}
+        self._cursor_row = 0
+        self._has_more_pages = False
+        self._loading_page = False
+        # The list is newest or shortest first ('newest' or 'length'), optionally up to a length in seconds
+        self._order = 'newest'
+        self._max_length = None
+        self._max_lengths = [None] + [int(minutes) * 60 for minutes in get_conf('List', 'max_lengths').split(',')]
+        self._transcripts = TranscriptFetcher(self._db, workers=int(get_conf('Transcripts', 'workers')))
+        self._summary_pool = SummaryWorkerPool(
+            self._db,
+            fetch_transcript=self._transcripts.get,
+            summarize=summarize_text,
+            workers=int(get_conf('Summary', 'workers')),
+            priority=self._job_priority,
+            on_done=self._on_summary_done,
+        )
+        self._playlist_outbox = PlaylistOutbox(self._db, self._insert_into_playlist)
+        startup.mark('app init')
 
     def compose(self) -> ComposeResult:
         yield DataTable(cursor_type='row')
+        yield MetricsPanel()
         yield Footer()
 
     def on_mount(self) -> None:
         table = self.query_one(DataTable)
-        table.add_columns("T", "S", "Channel", "Length", "Title")
-        self.unwatched_videos = self._db.get_unwatched_videos()
+        for label, key in COLUMNS:
+            table.add_column(label, key=key)
         asyncio.create_task(self.task_get_videos())
-        asyncio.create_task(self.task_fetch_summary())
 
     async def task_get_videos(self, row=None) -> None:
+        # Reloads as many rows as are loaded now, so a refresh keeps the scrolled-in pages
         table = self.query_one(DataTable)
-        table.clear()
-        self.unwatched_videos = self._db.get_unwatched_videos()
-        for video in self.unwatched_videos:
-            has_transcript = 'y' if video.get('transcription') else 'n'
-            has_summary = 'y' if video.get('summary') else 'n'
-            table.add_row(
-                has_transcript,
-                has_summary,
-                video.get('channel', 'No channel'),
-                video.get('duration', 'No duration'),
-                video.get('title', 'No title')
-            )
-        if row is not None:
-            new_row = min(row, len(table.rows) - 1)
-            table.move_cursor(row=new_row)
-
-    async def task_fetch_summary(self) -> None:
-        while True:
-            try:
-                videos = self._db.get_unwatched_videos()
-                videos = [video for video in videos if not video.get('summary')]
-                for video in videos:
-                    video_id = video.get('id')
-                    if video.get('transcription') and video.get('summary'):
-                        continue
-
-                    if not video.get('transcription'):
-                        transcript = get_youtube_transcript(video_id)
-                        if transcript:
-                            self._db.add_transcription(video_id, transcript)
-                    else:
-                        transcript = video.get('transcription')
-
-                    summary = summarize_text(transcript)
-                    if summary:
-                        self._db.add_summary(video_id, summary)
-
-                    table = self.query_one(DataTable)
-                    row = table.cursor_row
-                    await self.task_get_videos(row)
-
-                    await asyncio.sleep(120)
-
-                await asyncio.sleep(120)
-
-            except Exception as e:
-                logger.error(f"Error in background processing: {e}")
-                await asyncio.sleep(120)
+        limit = max(PAGE_SIZE, len(self.unwatched_videos))
+        videos = self._db.get_unwatched_page(limit=limit, order=self._order, max_length=self._max_length)
+        self._has_more_pages = len(videos) == limit
+        cursor_video_id = self._video_id_at(table.cursor_row) if table.row_count else None
+        sync_table(table, self.unwatched_videos, videos)
+        self.unwatched_videos = videos
+        self._row_index = {video['id']: i for i, video in enumerate(videos)}
+        if row is None and cursor_video_id in self._row_index:
+            row = self._row_index[cursor_video_id]
+        if row is not None and table.row_count:
+            table.move_cursor(row=min(row, table.row_count - 1))
+        if self._background_started:
+            self._submit_summary_jobs(videos)
+        else:
+            startup.mark('cached list loaded')
+            self.call_after_refresh(self._start_background_work)
+
+    def _start_background_work(self) -> None:
+        # Only once the cached list is on screen: the workers load the network client libraries
+        startup.mark('first paint')
+        if self._profile_startup:
+            self.exit()
+            return
+        self._background_started = True
+        self._summary_pool.start()
+        self._playlist_outbox.start()
+        self._submit_summary_jobs(self.unwatched_videos)
+        # main.py saves the rest on exit
+        self.set_interval(float(get_conf('Metrics', 'flush_interval')), self._save_metrics)
+
+    def _save_metrics(self) -> None:
+        if metrics.pending():
+            self.run_worker(lambda: metrics.flush(self._db), thread=True, group='metrics')
+
+    async def task_load_next_page(self) -> None:
+        if self._loading_page or not self._has_more_pages or not self.unwatched_videos:
+            return
+        self._loading_page = True
+        try:
+            last = self.unwatched_videos[-1]
+            page = self._db.get_unwatched_page(after=page_key(last, self._order), order=self._order,
+                                               max_length=self._max_length)
+            self._has_more_pages = len(page) == PAGE_SIZE
+            page = [video for video in page if video['id'] not in self._row_index]
+            start = len(self.unwatched_videos)
+            videos = self.unwatched_videos + page
+            sync_table(self.query_one(DataTable), self.unwatched_videos, videos)
+            self.unwatched_videos = videos
+            self._row_index.update({video['id']: start + i for i, video in enumerate(page)})
+            if self._background_started:
+                self._submit_summary_jobs(page)
+        finally:
+            self._loading_page = False
+
+    def _video_id_at(self, row: int) -> Optional[str]:
+        if 0 <= row < len(self.unwatched_videos):
+            return self.unwatched_videos[row]['id']
+        return None
+
+    def _remove_video(self, video_id: str) -> None:
+        table = self.query_one(DataTable)
+        row = self._row_index.get(video_id)
+        if row is None:
+            return
+        table.remove_row(video_id)
+        del self.unwatched_videos[row]
+        self._row_index = {video['id']: i for i, video in enumerate(self.unwatched_videos)}
+        if table.row_count:
+            table.move_cursor(row=min(row, table.row_count - 1))
+
+    def _update_video_flags(self, video_id: str) -> None:
+        row = self._row_index.get(video_id)
+        video = self._db.get_video(video_id)
+        if row is None or not video:
+            return
+        self.unwatched_videos[row] = video
+        update_flag_cells(self.query_one(DataTable), video)
+
+    def _submit_summary_jobs(self, videos: List[Dict[str, Any]]) -> None:
+        self._summary_pool.submit(video['id'] for video in videos if not video.get('has_summary'))
+        # Transcripts arrive ahead of the summary workers, which mostly wait on the model
+        missing = [video['id'] for video in videos if not video.get('has_transcript')]
+        if missing:
+            self.run_worker(lambda: self._prefetch_transcripts(missing), thread=True, group='transcripts')
+
+    def _prefetch_transcripts(self, video_ids: List[str]) -> None:
+        for video_id in self._transcripts.prefetch(video_ids):
+            self.call_from_thread(self._update_video_flags, video_id)
+
+    def _job_priority(self, video_id: str) -> int:
+        # Called from worker threads: distance from the cursor, rows not on screen go last
+        row = self._row_index.get(video_id)
+        if row is None:
+            return len(self._row_index)
+        return abs(row - self._cursor_row)
+
+    def _on_summary_done(self, video_id: str) -> None:
+        self.call_from_thread(self._update_video_flags, video_id)
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        self._cursor_row = event.cursor_row
+        # Fetch the next page before the cursor reaches the last loaded row
+        if event.cursor_row >= len(self.unwatched_videos) - PAGE_SIZE // 4:
+            asyncio.create_task(self.task_load_next_page())
+
+    def on_unmount(self) -> None:
+        self._summary_pool.stop(timeout=1)
+        self._playlist_outbox.stop(timeout=1)
 
     async def task_update_feed(self) -> None:
         logger.info("Refreshing feed")
-        youtube = get_authenticated_service()
-        videos = get_subscription_feed(youtube)
-        self._db.add_videos(videos)
-        logger.info("Refreshed feed")
-        asyncio.create_task(self.task_get_videos())
+        chunk_size = int(get_conf('Database', 'insert_chunk_size'))
+        # Authenticating may import the Google client libraries, so it stays off the event loop too
+        stats = await asyncio.to_thread(
+            lambda: sync_subscription_feed(get_authenticated_service(), self._db, chunk_size))
+        logger.info(f"Refreshed feed: {stats}")
+        await self.task_get_videos()
 
     def action_ditch(self):
         table = self.query_one(DataTable)
@@ -161,32 +436,59 @@ class VideoApp(App):
         video = self.unwatched_videos[row]
         video_id = video.get('id')
         self._db.mark_as_ditched(video_id)
-        asyncio.create_task(self.task_get_videos(row))
+        self._remove_video(video_id)
 
     def action_show_details(self) -> None:
         table = self.query_one(DataTable)
         row = table.cursor_row
-        video = self.unwatched_videos[row]
+        self._show_details(self.unwatched_videos[row])
+
+    def _show_details(self, video) -> None:
         video_id = video.get('id')
-        summary = video.get('summary')
-        if not summary:
-            transcript = get_youtube_transcript(video_id)
-            summary = summarize_text(transcript)
-            self._db.add_transcription(video_id, transcript)
-            self._db.add_summary(video_id, summary)
+        summary = self._db.get_summary(video_id) if video.get('has_summary') else None
         title = self.sanitize_title(video.get('title'))
-        self.push_screen(VideoPopup(video_id=video_id, title=title, summary=summary))
+        if summary:
+            self.push_screen(VideoPopup(video_id=video_id, title=title, summary=summary))
+            return
+        self._open_streaming_popup(video, title, SUMMARY_PROMPT)
 
     def action_show_extended_details(self) -> None:
         table = self.query_one(DataTable)
         row = table.cursor_row
         video = self.unwatched_videos[row]
-        video_id = video.get('id')
-        transcript = get_youtube_transcript(video_id)
-        summary = extended_summarize_text(transcript)
-        self._db.add_transcription(video_id, transcript)
         title = self.sanitize_title(video.get('title'))
-        self.push_screen(VideoPopup(video_id=video_id, title=title, summary=summary))
+        self._open_streaming_popup(video, title, EXTENDED_PROMPT)
+
+    def _open_streaming_popup(self, video, title: str, prompt_id: str) -> None:
+        popup = VideoPopup(video_id=video.get('id'), title=title)
+        self.push_screen(popup)
+        self.run_worker(lambda: self._stream_into_popup(popup, video, prompt_id), thread=True)
+
+    def _stream_into_popup(self, popup: VideoPopup, video, prompt_id: str) -> None:
+        # Runs in a worker thread; popup updates go through call_from_thread
+        video_id = video.get('id')
+        try:
+            transcript = self._transcripts.get(video_id)
+            if not transcript:
+                self.call_from_thread(popup.append, "No transcript available for this video.")
+                return
+            if not video.get('has_transcript'):
+                self.call_from_thread(self._update_video_flags, video_id)
+
+            parts = []
+            for text in stream_summary(transcript, prompt_id, snippet_texts(self._db, video_id)):
+                if popup.cancelled.is_set():
+                    return
+                parts.append(text)
+                self.call_from_thread(popup.append, text)
+
+            # Extended summaries are kept in the summary cache, short ones also belong to the video row
+            if prompt_id == SUMMARY_PROMPT:
+                self._db.add_summary(video_id, "".join(parts))
+                self.call_from_thread(self._update_video_flags, video_id)
+        except Exception as e:
+            logger.error(f"Error streaming {prompt_id} for {video_id}: {e}")
+            self.call_from_thread(popup.append, f"\n\nCould not summarize this video: {e}")
 
     def sanitize_title(self, title: str) -> str:
         return title.replace("!", "")
@@ -199,7 +501,41 @@ class VideoApp(App):
         if navigate:
             webbrowser.open(f"https://www.youtube.com/watch?v={video_id}")
         self._db.mark_as_watched(video_id)
-        asyncio.create_task(self.task_get_videos(row))
+        self._remove_video(video_id)
+
+    def action_toggle_metrics(self) -> None:
+        panel = self.query_one(MetricsPanel)
+        panel.display = not panel.display
+        panel.refresh_metrics()
+
+    def action_cycle_max_length(self) -> None:
+        self._max_length = self._max_lengths[(self._max_lengths.index(self._max_length) + 1) % len(self._max_lengths)]
+        self._reload_list()
+
+    def action_toggle_order(self) -> None:
+        self._order = 'newest' if self._order == 'length' else 'length'
+        self._reload_list()
+
+    def _reload_list(self) -> None:
+        order = 'Shortest first' if self._order == 'length' else 'Newest first'
+        limit = f", up to {self._max_length // 60} min" if self._max_length else ""
+        self.notify(order + limit)
+        asyncio.create_task(self.task_get_videos())
+
+    def action_search(self) -> None:
+        self.push_screen(SearchScreen(self._db), callback=self._show_search_result)
+
+    def _show_search_result(self, video_id: Optional[str]) -> None:
+        if video_id is None:
+            return
+        # Videos in the list are selected there, watched or ditched ones open their summary
+        row = self._row_index.get(video_id)
+        if row is not None:
+            self.query_one(DataTable).move_cursor(row=row)
+            return
+        video = self._db.get_video(video_id)
+        if video:
+            self._show_details(video)
 
     def action_refresh(self):
         asyncio.create_task(self.task_update_feed())
@@ -208,54 +544,12 @@ class VideoApp(App):
         table = self.query_one(DataTable)
         row = table.cursor_row
         video = self.unwatched_videos[row]
-        video_id = video.get('id')
-
-        youtube = get_authenticated_service()
-
-        try:
-            playlists_response = youtube.playlists().list(
-                part="snippet",
-                mine=True
-            ).execute()
-
-            playlist_id = None
-            for item in playlists_response.get('items', []):
-                if item['snippet']['title'] == "faria-next":
-                    playlist_id = item['id']
-                    break
-
-            # Create the playlist if it doesn't exist
-            if not playlist_id:
-                playlist_request = youtube.playlists().insert(
-                    part="snippet,status",
-                    body={
-                        "snippet": {
-                            "title": "faria-next",
-                            "description": "Playlist for next videos to watch",
-                            "tags": ["faria", "next", "videos"],
-                            "defaultLanguage": "en"
-                        },
-                        "status": {
-                            "privacyStatus": "private"
-                        }
-                    }
-                ).execute()
-                playlist_id = playlist_request['id']
-
-            youtube.playlistItems().insert(
-                part="snippet",
-                body={
-                    "snippet": {
-                        "playlistId": playlist_id,
-                        "resourceId": {
-                            "kind": "youtube#video",
-                            "videoId": video_id
-                        }
-                    }
-                }
-            ).execute()
-
-            self.action_watch(navigate=False)
-        except googleapiclient.errors.HttpError as e:
-            logger.error(f"An error occurred: {e}")
-
+        # Sent by the outbox thread, the row goes away right now; it stays when the outbox could not take it
+        if not self._playlist_outbox.add(video.get('id')):
+            self.notify(f"Could not queue {video.get('title')} for the playlist", severity="error")
+            return
+        self.action_watch(navigate=False)
+
+    def _insert_into_playlist(self, video_id: str) -> None:
+        add_video_to_playlist(get_authenticated_service(), self._db,
+                              get_conf('Playlist', 'next_videos_playlist_name'), video_id)
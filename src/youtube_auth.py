@@ -1,51 +1,123 @@
 import logging
 import os
 import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import threading
+from datetime import datetime, timedelta, timezone
 from src.utils import get_conf
 
+# The Google client libraries take most of a second to import, so they are imported by
+# the functions below the first time the API is used, never at startup
+
 
 logger = logging.getLogger('faria_logger')
 
+# Credentials are refreshed this long before they expire, so no request goes out with a stale token
+REFRESH_MARGIN = timedelta(minutes=5)
+HTTP_TIMEOUT = 60
 
-def get_authenticated_service():
-    try:
-        credentials = None
-        auth_token_path = get_conf('Paths', 'auth_token')
-        client_secret_path = get_conf('Paths', 'client_secret')
+_lock = threading.RLock()
+_credentials = None
+_service = None
+_local = threading.local()
+
+
+def _save_credentials(credentials) -> None:
+    with open(get_conf('Paths', 'auth_token'), 'wb') as token:
+        pickle.dump(credentials, token)
+
+
+def _load_credentials():
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
 
-        # Token file stores the user's credentials from previously successful logins
-        if os.path.exists(auth_token_path):
-            with open(auth_token_path, 'rb') as token:
-                credentials = pickle.load(token)
+    credentials = None
+    auth_token_path = get_conf('Paths', 'auth_token')
+    client_secret_path = get_conf('Paths', 'client_secret')
 
-        # If credentials are invalid or don't exist, log in.
+    # Token file stores the user's credentials from previously successful logins
+    if os.path.exists(auth_token_path):
+        with open(auth_token_path, 'rb') as token:
+            credentials = pickle.load(token)
+
+    # If credentials are invalid or don't exist, log in.
+    if not credentials or not credentials.valid:
+        if credentials and credentials.expired and credentials.refresh_token:
+            try:
+                credentials.refresh(Request())
+            except Exception as e:
+                # If refresh fails, force a new authorization flow
+                if "invalid_grant" in str(e) or "Token has been expired or revoked" in str(e):
+                    logger.info("Refresh token expired or revoked. Starting new auth flow.")
+                    credentials = None
+                else:
+                    raise
+
+        # If credentials still None, run the full auth flow
         if not credentials or not credentials.valid:
-            if credentials and credentials.expired and credentials.refresh_token:
-                try:
-                    credentials.refresh(Request())
-                except Exception as e:
-                    # If refresh fails, force a new authorization flow
-                    if "invalid_grant" in str(e) or "Token has been expired or revoked" in str(e):
-                        logger.info("Refresh token expired or revoked. Starting new auth flow.")
-                        credentials = None
-                    else:
-                        raise
-
-            # If credentials still None, run the full auth flow
-            if not credentials or not credentials.valid:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    client_secret_path,
-                    ['https://www.googleapis.com/auth/youtube.readonly', 'https://www.googleapis.com/auth/youtube'])
-                credentials = flow.run_local_server(port=8080)
-
-            # Save the credentials for the next run
-            with open(auth_token_path, 'wb') as token:
-                pickle.dump(credentials, token)
-
-        return build('youtube', 'v3', credentials=credentials)
+            flow = InstalledAppFlow.from_client_secrets_file(
+                client_secret_path,
+                ['https://www.googleapis.com/auth/youtube.readonly', 'https://www.googleapis.com/auth/youtube'])
+            credentials = flow.run_local_server(port=8080)
+
+        # Save the credentials for the next run
+        _save_credentials(credentials)
+
+    return credentials
+
+
+def _expiring(credentials) -> bool:
+    if credentials.expiry is None:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return credentials.expiry - now < REFRESH_MARGIN
+
+
+def get_credentials():
+    """Process-wide credentials, loaded once and refreshed shortly before they expire."""
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            _credentials = _load_credentials()
+        elif _expiring(_credentials) and _credentials.refresh_token:
+            from google.auth.transport.requests import Request
+            logger.info("Refreshing YouTube credentials")
+            _credentials.refresh(Request())
+            _save_credentials(_credentials)
+        return _credentials
+
+
+def get_thread_http():
+    """An authorized Http for the calling thread; httplib2 connections must not be shared between threads."""
+    import google_auth_httplib2
+    import httplib2
+
+    credentials = get_credentials()
+    http = getattr(_local, 'http', None)
+    if http is None or http.credentials is not credentials:
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        _local.http = http
+    return http
+
+
+def _build_request(http, *args, **kwargs):
+    from googleapiclient.http import HttpRequest
+
+    # Every request runs on the Http of the thread that builds it, which makes the shared service thread-safe
+    return HttpRequest(get_thread_http(), *args, **kwargs)
+
+
+def get_authenticated_service():
+    global _service
+    try:
+        from googleapiclient.discovery import build
+
+        with _lock:
+            if _service is None:
+                # static_discovery reads the discovery document bundled with googleapiclient instead of fetching it
+                _service = build('youtube', 'v3', credentials=get_credentials(),
+                                 requestBuilder=_build_request, static_discovery=True)
+            return _service
     except Exception as e:
         logger.error(f"Authentication error: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,31 @@
+import logging
+import urllib.request
+import xml.etree.ElementTree as ET
+from typing import List, Optional
+
+from src.utils import get_conf
+
+
+logger = logging.getLogger('faria_logger')
+FEED_TIMEOUT = 10
+
+ATOM_ENTRY = '{http://www.w3.org/2005/Atom}entry'
+YT_VIDEO_ID = '{http://www.youtube.com/xml/schemas/2015}videoId'
+
+
+def get_feed_video_ids(channel_id: str, url_template: Optional[str] = None) -> List[str]:
+    """Video ids in a channel's public uploads Atom feed, newest first.
+
+    The feed is parsed as it streams in and entries are discarded once read, so
+    only the ids are kept. url_template defaults to [API] rss_feed_url and may be a
+    file:// URL for local fixtures.
+    """
+    video_ids = []
+    url = (url_template or get_conf('API', 'rss_feed_url')).format(channel_id=channel_id)
+    with urllib.request.urlopen(url, timeout=FEED_TIMEOUT) as response:
+        for _, element in ET.iterparse(response, events=('end',)):
+            if element.tag == YT_VIDEO_ID:
+                video_ids.append(element.text)
+            elif element.tag == ATOM_ENTRY:
+                element.clear()
+    return video_ids
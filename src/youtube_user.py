@@ -1,142 +1,369 @@
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
+from src import metrics
 from src.database import VideoDatabase
+from src.rate_limit import call_with_backoff, get_limiter
 from src.utils import get_conf
+from src.youtube_rss import get_feed_video_ids
 
 
-db = VideoDatabase()
 logger = logging.getLogger('faria_logger')
-MAX_RESULTS_PER_PAGE = get_conf('API', 'max_results_per_page')
-
-def get_subscriptions(youtube):
+CHANNELS_PER_REQUEST = 50
+NOT_MODIFIED = 304
+FORBIDDEN = 403
+NOT_FOUND = 404
+TOO_MANY_REQUESTS = 429
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+# Quota cost of playlists().insert and playlistItems().insert
+INSERT_QUOTA_UNITS = 50
+# contentDetails.duration, e.g. PT1H2M3S, P1DT2H or P0D for a live stream
+ISO_DURATION = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+
+def _execute(request, quota_units: int = 1) -> Dict[str, Any]:
+    # The service from get_authenticated_service gives each thread its own Http, so workers can share it
+    limiter = get_limiter('youtube')
+    # googleapiclient requests carry their method as methodId, e.g. youtube.playlistItems.list
+    method = getattr(request, 'methodId', None) or getattr(request, 'method', 'unknown')
+
+    def execute():
+        metrics.count('youtube_quota_units', quota_units)
+        with metrics.timer('youtube_request', method=method):
+            return request.execute()
+
+    try:
+        return call_with_backoff(limiter, execute, _is_rate_limited, quota_units=quota_units)
+    except Exception as e:
+        if _status(e) == FORBIDDEN and 'quotaExceeded' in str(e):
+            limiter.exhaust()
+        raise
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    status = _status(error)
+    if status == TOO_MANY_REQUESTS:
+        return True
+    return status == FORBIDDEN and any(reason in str(error) for reason in RATE_LIMIT_REASONS)
+
+
+def get_subscriptions(youtube, db: VideoDatabase):
     channel_ids = []
+    titles = {}
     next_page_token = None
+    max_results = get_conf('API', 'max_results_per_page')
 
     while True:
-        subscription_response = youtube.subscriptions().list(
+        subscription_response = _execute(youtube.subscriptions().list(
             part='snippet',
             mine=True,
-            maxResults=MAX_RESULTS_PER_PAGE,
+            maxResults=max_results,
             pageToken=next_page_token
-        ).execute()
+        ))
 
         for item in subscription_response['items']:
-            channel_ids.append(item['snippet']['resourceId']['channelId'])
+            channel_id = item['snippet']['resourceId']['channelId']
+            channel_ids.append(channel_id)
+            titles[channel_id] = item['snippet']['title']
 
         next_page_token = subscription_response.get('nextPageToken')
         if not next_page_token:
             break
 
+    db.update_channel_titles(titles)
     return channel_ids
 
 
-# TODO this should only get videos that are after the last uploaded for each channel
-def get_subscription_feed(youtube):
-    feed_videos = []
-    channel_ids = get_subscriptions(youtube)
-
-    # TODO exclude watched and disliked videos
-
-    logger.info(f"Found {len(channel_ids)} subscriptions")
+def get_channel_metadata(youtube, db: VideoDatabase, channel_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Title and uploads playlist id per channel, from the channels cache or batched channels().list calls."""
+    channels = db.get_channels(channel_ids, int(get_conf('API', 'channel_cache_ttl_hours')) * 3600)
+    missing = [channel_id for channel_id in channel_ids if channel_id not in channels]
+    logger.info(f"Channel metadata: {len(channels)} cached, {len(missing)} to fetch")
 
-    for channel_id in channel_ids:
+    fetched = []
+    for i in range(0, len(missing), CHANNELS_PER_REQUEST):
+        batch = missing[i:i + CHANNELS_PER_REQUEST]
         try:
-            logger.info(f"Fetching videos for channel {channel_id}")
-            # Get channel uploads playlist
-            channels_response = youtube.channels().list(
+            channels_response = _execute(youtube.channels().list(
                 part="contentDetails,snippet",
-                id=channel_id
-            ).execute()
+                id=','.join(batch),
+                maxResults=CHANNELS_PER_REQUEST
+            ))
+        except Exception as e:
+            logger.exception(f"Error fetching metadata for {len(batch)} channels: {e}")
+            continue
 
-            if not channels_response.get('items'):
-                continue
+        for item in channels_response.get('items', []):
+            fetched.append({
+                'id': item['id'],
+                'title': item['snippet']['title'],
+                'uploads_playlist_id': item['contentDetails']['relatedPlaylists']['uploads'],
+            })
 
-            channel_item = channels_response['items'][0]
-            channel_title = channel_item['snippet']['title']
-            uploads_playlist_id = channel_item['contentDetails']['relatedPlaylists']['uploads']
+    if fetched:
+        db.add_channels(fetched)
+    channels.update({channel['id']: channel for channel in fetched})
+    return channels
 
-            latest_video_date = db.get_latest_video_date_for_channel(channel_title)
 
-            next_page_token = None
-            channel_videos = []
-            found_existing = False
-
-            # Loop to get all videos from the playlist using pagination
-            while True and not found_existing:
-                playlist_response = youtube.playlistItems().list(
-                    part="snippet",
-                    playlistId=uploads_playlist_id,
-                    maxResults=50,
-                    pageToken=next_page_token
-                ).execute()
-
-                for item in playlist_response.get('items', []):
-                    video_id = item['snippet']['resourceId']['videoId']
-                    published_at = item['snippet']['publishedAt']
-
-                    # If we have a latest date and this video is older, we've reached existing content
-                    if latest_video_date and published_at <= latest_video_date:
-                        found_existing = True
-                        logger.info(f"Reached existing content for channel {channel_title}, at {published_at} given {latest_video_date}")
-                        break
-
-                    channel_videos.append({
-                        'id': video_id,
-                        'title': item['snippet']['title'],
-                        'channel': channel_title,  # Use consistent channel name
-                        'published_at': published_at,
-                        'duration': ''  # Will be populated later
-                    })
-
-                next_page_token = playlist_response.get('nextPageToken')
-                if not next_page_token or found_existing:
-                    break
+def get_subscription_feed(youtube, db: VideoDatabase, workers: Optional[int] = None,
+                          stats: Optional[Dict[str, int]] = None, mode: Optional[str] = None,
+                          feed_url: Optional[str] = None):
+    feed_videos, _ = _crawl(youtube, db, workers, stats, mode, feed_url)
+    return feed_videos
 
-            if channel_videos:
-                # Get video durations in batches of 50
-                video_ids = [video['id'] for video in channel_videos]
-                all_durations = {}
 
-                for i in range(0, len(video_ids), 50):
-                    batch = video_ids[i:i + 50]
-                    videos_response = youtube.videos().list(
-                        part="contentDetails",
-                        id=','.join(batch)
-                    ).execute()
+def sync_subscription_feed(youtube, db: VideoDatabase, chunk_size: int, workers: Optional[int] = None,
+                           mode: Optional[str] = None, feed_url: Optional[str] = None) -> Dict[str, int]:
+    """Fetch new uploads, store them and advance the per-channel cursors, returns the sync stats.
 
-                    batch_durations = {item['id']: item['contentDetails']['duration']
-                                       for item in videos_response.get('items', [])}
-                    all_durations.update(batch_durations)
+    workers, mode and feed_url default to [API] feed_workers, feed_mode and rss_feed_url.
+    """
+    stats: Dict[str, int] = {}
+    feed_videos, states = _crawl(youtube, db, workers, stats, mode, feed_url)
+    counts = db.add_videos(feed_videos, chunk_size)
+    # Cursors only move once the videos they point past are stored
+    if counts is None:
+        stats['failed'] += len(states)
+        return stats
+    db.save_sync_states(states)
+    stats['videos_inserted'], stats['videos_updated'] = counts
+    return stats
 
-                for video in channel_videos:
-                    video['duration'] = _format_duration(all_durations.get(video['id'], ''))
 
-                feed_videos.extend(channel_videos)
+def _crawl(youtube, db: VideoDatabase, workers: Optional[int], stats: Optional[Dict[str, int]],
+           mode: Optional[str], feed_url: Optional[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    workers = workers or int(get_conf('API', 'feed_workers'))
+    mode = mode or get_conf('API', 'feed_mode')
+    channel_ids = get_subscriptions(youtube, db)
 
-        except Exception as e:
-            logger.exception(f"Error fetching videos for channel {channel_id}: {e}")
-            continue
+    # TODO exclude watched and disliked videos
 
-    feed_videos.sort(key=lambda x: x['published_at'], reverse=True)
-    return feed_videos
+    logger.info(f"Found {len(channel_ids)} subscriptions, crawling with {workers} workers")
 
+    channels = get_channel_metadata(youtube, db, channel_ids)
+    channels = [channels[channel_id] for channel_id in channel_ids if channel_id in channels]
+    sync_states = db.get_sync_states([channel['id'] for channel in channels])
+    counts = {'skipped': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
 
-def _format_duration(iso_duration):
-    """Convert ISO 8601 duration format (PT#H#M#S) to human-readable MM:SS or HH:MM:SS"""
-    if not iso_duration:
-        return ""
+    if mode == 'rss':
+        changed = _channels_with_unseen_uploads(db, channels, workers, feed_url or get_conf('API', 'rss_feed_url'))
+        counts['skipped'] += len(channels) - len(changed)
+        channels = changed
 
-    import re
+    # map() yields results in channel order, whatever order the workers finish in
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(
+            lambda channel: _fetch_channel_videos(youtube, db, channel, sync_states.get(channel['id'])),
+            channels
+        ))
 
-    hours_match = re.search(r'(\d+)H', iso_duration)
-    minutes_match = re.search(r'(\d+)M', iso_duration)
-    seconds_match = re.search(r'(\d+)S', iso_duration)
+    feed_videos = []
+    states = []
+    for status, channel_videos, state in results:
+        counts[status] += 1
+        feed_videos.extend(channel_videos)
+        if state:
+            states.append(state)
+    logger.info(f"Feed sync: {counts['skipped']} skipped, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['failed']} failed")
+    if stats is not None:
+        stats.update(counts)
+
+    feed_videos.sort(key=lambda x: (x['published_at'], x['id']), reverse=True)
+    return feed_videos, states
+
+
+def _channels_with_unseen_uploads(db: VideoDatabase, channels: List[Dict[str, Any]], workers: int,
+                                  feed_url: str) -> List[Dict[str, Any]]:
+    """Channels whose uploads feed lists a video we have not stored, or whose feed could not be read."""
+    def feed_ids(channel):
+        try:
+            return get_feed_video_ids(channel['id'], feed_url)
+        except Exception as e:
+            logger.warning(f"Uploads feed failed for channel {channel['id']}, using the Data API: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        feeds = list(pool.map(feed_ids, channels))
+
+    known = db.get_existing_video_ids([video_id for ids in feeds if ids for video_id in ids])
+    changed = [channel for channel, ids in zip(channels, feeds) if ids is None or not known.issuperset(ids)]
+    logger.info(f"Uploads feeds: {len(channels) - len(changed)} of {len(channels)} channels have nothing new")
+    return changed
+
+
+def _fetch_channel_videos(youtube, db: VideoDatabase, channel: Dict[str, Any],
+                          state: Optional[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Returns (status, new videos, new sync state) where status is skipped, updated, unchanged or failed."""
+    channel_id = channel['id']
+    try:
+        logger.info(f"Fetching videos for channel {channel_id}")
+        channel_title = channel['title']
+        uploads_playlist_id = channel['uploads_playlist_id']
+
+        if state:
+            last_video_id = state['last_video_id']
+            latest_video_date = state['last_published_at']
+        else:
+            # Channels synced before sync_state existed fall back to the stored videos
+            last_video_id = None
+            latest_video_date = db.get_latest_video_date_for_channel(channel_title)
 
-    hours = int(hours_match.group(1)) if hours_match else 0
-    minutes = int(minutes_match.group(1)) if minutes_match else 0
-    seconds = int(seconds_match.group(1)) if seconds_match else 0
+        next_page_token = None
+        channel_videos = []
+        found_existing = False
+        new_state = None
+
+        # Loop to get all videos from the playlist using pagination
+        while not found_existing:
+            request = youtube.playlistItems().list(
+                part="snippet",
+                playlistId=uploads_playlist_id,
+                maxResults=50,
+                pageToken=next_page_token
+            )
+            if next_page_token is None and state and state['etag']:
+                request.headers['If-None-Match'] = state['etag']
+            try:
+                playlist_response = _execute(request)
+            except Exception as e:
+                if _status(e) == NOT_MODIFIED:
+                    logger.info(f"Channel {channel_title} unchanged since last sync")
+                    return 'skipped', [], None
+                raise
+
+            items = playlist_response.get('items', [])
+            if new_state is None:
+                newest = items[0]['snippet'] if items else {}
+                new_state = {
+                    'channel_id': channel_id,
+                    'last_video_id': newest.get('resourceId', {}).get('videoId', last_video_id),
+                    'last_published_at': newest.get('publishedAt', latest_video_date),
+                    'etag': playlist_response.get('etag'),
+                }
+
+            for item in items:
+                video_id = item['snippet']['resourceId']['videoId']
+                published_at = item['snippet']['publishedAt']
+
+                # Stop at the newest video seen last time, or anything older than it
+                if video_id == last_video_id or (latest_video_date and published_at <= latest_video_date):
+                    found_existing = True
+                    logger.info(f"Reached existing content for channel {channel_title}, at {published_at} given {latest_video_date}")
+                    break
 
-    if hours > 0:
-        return f"{hours}:{minutes:02d}:{seconds:02d}"
-    else:
-        return f"{minutes}:{seconds:02d}"
\ No newline at end of file
+                channel_videos.append({
+                    'id': video_id,
+                    'title': item['snippet']['title'],
+                    'channel': channel_title,  # Use consistent channel name
+                    'published_at': published_at,
+                    'duration': 0  # Will be populated later
+                })
+
+            next_page_token = playlist_response.get('nextPageToken')
+            if not next_page_token:
+                break
+
+        if channel_videos:
+            all_durations = _fetch_durations(youtube, [video['id'] for video in channel_videos])
+            for video in channel_videos:
+                video['duration'] = all_durations.get(video['id'], 0)
+
+        return ('updated' if channel_videos else 'unchanged'), channel_videos, new_state
+
+    except Exception as e:
+        logger.exception(f"Error fetching videos for channel {channel_id}: {e}")
+        return 'failed', [], None
+
+
+def get_playlist_id(youtube, db: VideoDatabase, title: str) -> str:
+    """Id of the user's playlist called title, created if there is none; resolved once and kept in the DB."""
+    key = f"playlist_id:{title}"
+    playlist_id = db.get_setting(key)
+    if playlist_id:
+        return playlist_id
+
+    request = youtube.playlists().list(part="snippet", mine=True, maxResults=get_conf('API', 'max_results_per_page'),
+                                       fields="nextPageToken,items(id,snippet/title)")
+    while request is not None and not playlist_id:
+        response = _execute(request)
+        playlist_id = next((item['id'] for item in response.get('items', []) if item['snippet']['title'] == title), None)
+        request = youtube.playlists().list_next(request, response)
+
+    if not playlist_id:
+        logger.info(f"Creating playlist {title}")
+        playlist_id = _execute(youtube.playlists().insert(
+            part="snippet,status",
+            body={
+                "snippet": {
+                    "title": title,
+                    "description": "Playlist for next videos to watch",
+                    "tags": ["faria", "next", "videos"],
+                    "defaultLanguage": "en"
+                },
+                "status": {
+                    "privacyStatus": "private"
+                }
+            }
+        ), quota_units=INSERT_QUOTA_UNITS)['id']
+
+    db.set_setting(key, playlist_id)
+    return playlist_id
+
+
+def add_video_to_playlist(youtube, db: VideoDatabase, title: str, video_id: str) -> None:
+    playlist_id = get_playlist_id(youtube, db, title)
+    try:
+        _execute(youtube.playlistItems().insert(
+            part="snippet",
+            body={
+                "snippet": {
+                    "playlistId": playlist_id,
+                    "resourceId": {
+                        "kind": "youtube#video",
+                        "videoId": video_id
+                    }
+                }
+            }
+        ), quota_units=INSERT_QUOTA_UNITS)
+    except Exception as e:
+        # The playlist was deleted on YouTube, the next attempt looks it up or creates it again
+        if _status(e) == NOT_FOUND and 'playlistNotFound' in str(e):
+            db.set_setting(f"playlist_id:{title}", None)
+        raise
+
+
+def _status(error: Exception) -> Optional[int]:
+    # googleapiclient's HttpError carries the httplib2 response in .resp
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    return int(status) if status is not None else None
+
+
+def _fetch_durations(youtube, video_ids: List[str]) -> Dict[str, int]:
+    # Get video durations in batches of 50
+    all_durations = {}
+    for i in range(0, len(video_ids), 50):
+        batch = video_ids[i:i + 50]
+        videos_response = _execute(youtube.videos().list(
+            part="contentDetails",
+            id=','.join(batch)
+        ))
+        all_durations.update(parse_durations(videos_response.get('items', [])))
+    return all_durations
+
+
+def parse_durations(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Length in seconds of each video in a videos().list response, 0 when it has none."""
+    durations = {}
+    match = ISO_DURATION.fullmatch
+    for item in items:
+        parts = match(item.get('contentDetails', {}).get('duration') or '')
+        if parts is None:
+            durations[item['id']] = 0
+            continue
+        days, hours, minutes, seconds = parts.groups(0)
+        durations[item['id']] = ((int(days) * 24 + int(hours)) * 60 + int(minutes)) * 60 + int(seconds)
+    return durations